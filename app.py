@@ -1,40 +1,169 @@
-import json
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+import fast_json
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, Response, stream_with_context
 from functools import wraps
 import time
+import threading
+import secrets
+import sqlite3
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
 
 
 app = Flask(__name__)
 app.secret_key = 'your_strong_secret_key_here_for_security'
+app.json = fast_json.FastJSONProvider(app)
+# Templates are compiled once and never re-checked against the filesystem
+app.config['TEMPLATES_AUTO_RELOAD'] = False
 
-USER_DB_PATH = os.path.join('data', 'users.json')
+os.makedirs('data', exist_ok=True)
+USER_DB_PATH = os.path.join('data', 'users.db')
+LEGACY_USER_JSON_PATH = os.path.join('data', 'users.json')
 
 # Backend API URLs
-ENCRYPTION_API_URL = "http://127.0.0.1:5001"
-STORAGE_API_URL = "http://127.0.0.1:5002"
+ENCRYPTION_API_URL = os.environ.get("ENCRYPTION_API_URL", "http://127.0.0.1:5001")
+STORAGE_API_URL = os.environ.get("STORAGE_API_URL", "http://127.0.0.1:5002")
 
-def load_users():
-    try:
-        with open(USER_DB_PATH, 'r') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        save_users([])
-        return []
+# Tally status relay: connections are dropped after this long (the browser's
+# EventSource reconnects), and a stalled storage stream times out after
+# STATUS_STREAM_READ_TIMEOUT (storage sends a keep-alive every 15 s)
+STATUS_STREAM_MAX_SECONDS = 300
+STATUS_STREAM_READ_TIMEOUT = 60
+
+# In-process hooks set by combined.py; None means call the services over HTTP.
+# LOCAL_ENCRYPT_AND_STORE(vote_data) -> (result dict, HTTP status)
+# LOCAL_STATUS_STREAM() -> the storage service's SSE Response
+LOCAL_ENCRYPT_AND_STORE = None
+LOCAL_STATUS_STREAM = None
+
+# Shared HTTP session so calls to the backend services reuse keep-alive
+# connections instead of opening a new TCP connection per request
+API_SESSION = requests.Session()
+API_SESSION.mount('http://', HTTPAdapter(
+    pool_connections=50,
+    pool_maxsize=50,
+    max_retries=Retry(total=3, backoff_factor=0.1)
+))
+
+# Users live in SQLite with the voter ID as primary key, so lookups are an
+# index probe and a vote is a single-row UPDATE instead of a file rewrite.
+# Each thread keeps its own connection, as sqlite3 connections can't be shared.
+_DB_LOCAL = threading.local()
+
+def get_db():
+    conn = getattr(_DB_LOCAL, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(USER_DB_PATH)
+        conn.row_factory = sqlite3.Row
+        _DB_LOCAL.conn = conn
+    return conn
+
+def init_user_db():
+    """Create the users table, importing any existing users.json once"""
+    conn = get_db()
+    conn.execute('PRAGMA journal_mode=WAL')
+    with conn:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS users("
+            "id TEXT PRIMARY KEY, password TEXT NOT NULL, voted INTEGER NOT NULL DEFAULT 0"
+            ") WITHOUT ROWID"
+        )
+        if conn.execute("SELECT 1 FROM users LIMIT 1").fetchone() is None:
+            try:
+                with open(LEGACY_USER_JSON_PATH, 'rb') as f:
+                    legacy_users = fast_json.load(f)
+            except (FileNotFoundError, fast_json.JSONDecodeError):
+                legacy_users = []
+            conn.executemany(
+                "INSERT OR IGNORE INTO users(id, password, voted) VALUES (?, ?, ?)",
+                [(u['id'], u['password'], int(u.get('voted', False))) for u in legacy_users]
+            )
+            if legacy_users:
+                print(f"Imported {len(legacy_users)} users from {LEGACY_USER_JSON_PATH}")
+
+def _row_to_user(row):
+    return {"id": row['id'], "password": row['password'], "voted": bool(row['voted'])}
+
+def get_user(user_id):
+    """Look up a user by ID via the primary key index"""
+    row = get_db().execute(
+        "SELECT id, password, voted FROM users WHERE id = ?", (user_id,)
+    ).fetchone()
+    return _row_to_user(row) if row else None
 
-def save_users(users):
-    with open(USER_DB_PATH, 'w') as f:
-        json.dump(users, f, indent=4)
+def add_user(user):
+    """Register a new user; returns False if the ID is already taken"""
+    conn = get_db()
+    with conn:
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO users(id, password, voted) VALUES (?, ?, ?)",
+            (user['id'], user['password'], int(user.get('voted', False)))
+        )
+    return cur.rowcount == 1
+
+def set_user_voted(user_id, voted=True):
+    """
+    Atomically set a user's voted flag
+    Returns False if the user does not exist or the flag already had that value,
+    so set_user_voted(user_id) doubles as a race-free check-then-set claim.
+    """
+    conn = get_db()
+    with conn:
+        cur = conn.execute(
+            "UPDATE users SET voted = ? WHERE id = ? AND voted = ?",
+            (int(voted), user_id, int(not voted))
+        )
+    return cur.rowcount == 1
 
 def mark_user_voted(user_id):
-    users = load_users()
-    for user in users:
-        if user['id'] == user_id:
-            user['voted'] = True
-            save_users(users)
-            return True
-    return False
+    return set_user_voted(user_id)
+
+# Vote receipts are kept server-side; the session cookie only carries an
+# opaque 'sid' that keys into this map, keeping the signed cookie small.
+# Entries are (expires_at, receipt) in insertion order, so the oldest come first.
+_VOTE_RECEIPTS = {}
+_VOTE_RECEIPTS_LOCK = threading.Lock()
+# Receipts not collected from /confirmation within this long are dropped
+VOTE_RECEIPT_TTL_SECONDS = 3600
+# Hard cap on stored receipts; the oldest are dropped first
+VOTE_RECEIPT_MAX_ENTRIES = 10000
+
+def store_vote_receipt(receipt, **session_updates):
+    """Save a receipt server-side, applying any session changes in one update"""
+    sid = session.get('sid') or secrets.token_urlsafe(16)
+    session.update(sid=sid, **session_updates)
+    now = time.monotonic()
+    with _VOTE_RECEIPTS_LOCK:
+        _VOTE_RECEIPTS.pop(sid, None)
+        while _VOTE_RECEIPTS:
+            oldest = next(iter(_VOTE_RECEIPTS))
+            if _VOTE_RECEIPTS[oldest][0] > now and len(_VOTE_RECEIPTS) < VOTE_RECEIPT_MAX_ENTRIES:
+                break
+            del _VOTE_RECEIPTS[oldest]
+        _VOTE_RECEIPTS[sid] = (now + VOTE_RECEIPT_TTL_SECONDS, receipt)
+
+def pop_vote_receipt():
+    sid = session.get('sid')
+    if sid is None:
+        return None
+    with _VOTE_RECEIPTS_LOCK:
+        entry = _VOTE_RECEIPTS.pop(sid, None)
+    if entry is None or entry[0] <= time.monotonic():
+        return None
+    return entry[1]
+
+# Rendered HTML of pages that have no per-request data. Pages showing
+# flashed messages are rendered normally so the messages still appear.
+_PAGE_CACHE = {}
+
+def render_static_page(template_name):
+    if '_flashes' in session:
+        return render_template(template_name)
+    html = _PAGE_CACHE.get(template_name)
+    if html is None:
+        html = _PAGE_CACHE[template_name] = render_template(template_name)
+    return html
 
 def login_required(f):
     @wraps(f)
@@ -54,54 +183,54 @@ def login():
     if request.method == 'POST':
         user_id = request.form.get('id')
         password = request.form.get('password')
-        users = load_users()
-        
-        user_match = next((u for u in users if u['id'] == user_id and u['password'] == password), None)
+        user = get_user(user_id)
+        user_match = user if user and user['password'] == password else None
         
         if user_match:
             if user_match['voted']:
                 flash(f"Error: Voter ID {user_id} has already cast a vote.", 'warning')
-                return render_template('login.html')
+                return render_static_page('login.html')
             
             session['user_id'] = user_id
             session['logged_in'] = True
+            session['voted'] = user_match['voted']
             flash('Login successful.', 'success')
             return redirect(url_for('vote'))
         else:
             flash('Invalid Voter ID or Password.', 'danger')
     
-    return render_template('login.html')
+    return render_static_page('login.html')
 
 @app.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         user_id = request.form.get('id')
         password = request.form.get('password')
-        users = load_users()
-        
-        if any(u['id'] == user_id for u in users):
+        if not add_user({"id": user_id, "password": password, "voted": False}):
             flash('This Voter ID is already registered.', 'danger')
         else:
-            users.append({"id": user_id, "password": password, "voted": False})
-            save_users(users)
             flash('Registration successful! Please login.', 'success')
             return redirect(url_for('login'))
     
-    return render_template('register.html')
+    return render_static_page('register.html')
 
 @app.route('/logout')
 def logout():
     session.pop('user_id', None)
     session.pop('logged_in', None)
+    session.pop('voted', None)
     flash('You have been logged out.', 'info')
     return redirect(url_for('login'))
 
 @app.route('/vote')
 @login_required
 def vote():
-    user_id = session.get('user_id')
-    users = load_users()
-    if next((u['voted'] for u in users if u['id'] == user_id), False):
+    # The voted flag cached at login avoids touching the user store on page loads
+    voted = session.get('voted')
+    if voted is None:
+        user = get_user(session.get('user_id'))
+        voted = bool(user and user['voted'])
+    if voted:
         flash("You have already cast your vote. Thank you!", 'warning')
         return redirect(url_for('confirmation'))
     
@@ -118,8 +247,9 @@ def submit_vote():
         flash("Error: Please select a candidate.", 'danger')
         return redirect(url_for('vote'))
     
-    users = load_users()
-    if next((u['voted'] for u in users if u['id'] == user_id), False):
+    # Claim the vote up front so concurrent submissions for the same voter
+    # cannot both pass the check; the claim is released if anything fails.
+    if session.get('voted') or not mark_user_voted(user_id):
         flash("Double voting attempt detected. Action blocked.", 'danger')
         return redirect(url_for('confirmation'))
     
@@ -129,92 +259,68 @@ def submit_vote():
         'timestamp': current_timestamp
     }
     
+    # The encryption service encrypts the vote and forwards it to the
+    # storage service, so the whole submission is a single round trip
+    stage = 'encryption'
     try:
-        encryption_response = requests.post(
-            f"{ENCRYPTION_API_URL}/encrypt_vote",
-            json=vote_data,
-            timeout=10
-        )
+        if LOCAL_ENCRYPT_AND_STORE is not None:
+            result, _ = LOCAL_ENCRYPT_AND_STORE(vote_data)
+        else:
+            response = API_SESSION.post(
+                f"{ENCRYPTION_API_URL}/encrypt_and_store",
+                json=vote_data,
+                timeout=20
+            )
+            result = response.json()
         
-        encryption_response.raise_for_status()
-        encrypted_vote_data = encryption_response.json()
+        stage = result.get('stage', stage)
         
-        if not encrypted_vote_data.get('success'):
-            error_msg = encrypted_vote_data.get('error', 'Unknown error')
-            raise ValueError(f"Encryption failed: {error_msg}")
+        if not result.get('success'):
+            error_msg = result.get('error', 'Unknown error')
+            raise ValueError(f"{stage.capitalize()} failed: {error_msg}")
         
-        encrypted_vote = encrypted_vote_data.get('encrypted_vote')
-        if not encrypted_vote:
-            raise ValueError("Invalid response format from Encryption API.")
+        vote_hash = result.get('vote_hash', 'N/A')
+        tallying_in_progress = result.get('tallying_in_progress', False)
     
     except requests.exceptions.RequestException as e:
         print(f"Error connecting to Encryption API: {e}")
+        set_user_voted(user_id, False)
         flash('Error: Secure encryption failed. Please try again.', 'danger')
         return redirect(url_for('vote'))
     
     except ValueError as e:
         print(f"Error processing response: {e}")
-        flash('Error: Encryption API returned invalid data.', 'danger')
-        return redirect(url_for('vote'))
-    
-    ledger_data = {
-        'voter_id': user_id,
-        'encrypted_vote': encrypted_vote,
-        'timestamp': current_timestamp
-    }
-    
-    try:
-        storage_response = requests.post(
-            f"{STORAGE_API_URL}/store_vote",
-            json=ledger_data,
-            timeout=10
-        )
-        
-        storage_response.raise_for_status()
-        storage_result = storage_response.json()
-        
-        if not storage_result.get('success'):
-            error_msg = storage_result.get('error', 'Unknown error')
-            raise ValueError(f"Storage failed: {error_msg}")
-        
-        vote_hash = storage_result.get('vote_hash', 'N/A')
-        tallying_in_progress = storage_result.get('tallying_in_progress', False)
-    
-    except requests.exceptions.RequestException as e:
-        print(f"Error connecting to Storage API: {e}")
-        flash('CRITICAL ERROR: Vote encrypted but failed to store in ledger.', 'danger')
-        return redirect(url_for('vote'))
-    
-    except ValueError as e:
-        print(f"Error processing response: {e}")
-        flash('CRITICAL ERROR: Storage API returned invalid response.', 'danger')
+        set_user_voted(user_id, False)
+        if stage == 'storage':
+            flash('CRITICAL ERROR: Vote encrypted but failed to store in ledger.', 'danger')
+        else:
+            flash('Error: Encryption API returned invalid data.', 'danger')
         return redirect(url_for('vote'))
     
-    mark_user_voted(user_id)
-    
-    session['vote_success'] = True
-    session['vote_candidate'] = selected_candidate
-    session['vote_timestamp'] = current_timestamp
-    session['vote_hash'] = vote_hash
-    session['tallying_in_progress'] = tallying_in_progress
-    
-    if tallying_in_progress:
-        flash('Your vote has been securely recorded. Tallying is in progress - your vote will be counted in the next tally!', 'success')
-    else:
-        flash('Your vote has been securely recorded and time-locked.', 'success')
+    store_vote_receipt({
+        'candidate': selected_candidate,
+        'timestamp': current_timestamp,
+        'vote_hash': vote_hash,
+        'tallying_in_progress': tallying_in_progress
+    }, voted=True)
     
-    return redirect(url_for('confirmation'))
+    # The success status travels in the query string rather than as a flash,
+    # which would re-serialize the session cookie on the hot path
+    return redirect(url_for('confirmation', status='tallying' if tallying_in_progress else 'ok'))
+
+CONFIRMATION_STATUS_MESSAGES = {
+    'ok': 'Your vote has been securely recorded and time-locked.',
+    'tallying': 'Your vote has been securely recorded. Tallying is in progress - your vote will be counted in the next tally!'
+}
 
 @app.route('/confirmation')
 def confirmation():
-    if session.get('vote_success'):
-        candidate = session.get('vote_candidate', 'N/A')
-        timestamp = session.get('vote_timestamp', 'N/A')
-        vote_hash = session.get('vote_hash', 'N/A')
-        tallying_in_progress = session.get('tallying_in_progress', False)
-        
-        session.pop('vote_success', None)
-        session.pop('tallying_in_progress', None)
+    receipt = pop_vote_receipt()
+    if receipt:
+        candidate = receipt.get('candidate', 'N/A')
+        timestamp = receipt.get('timestamp', 'N/A')
+        vote_hash = receipt.get('vote_hash', 'N/A')
+        tallying_in_progress = receipt.get('tallying_in_progress', False)
         
         message = f"Thank you! Your vote for Candidate {candidate} is confirmed."
         details = f"Submission Time: {timestamp}\n Vote Hash: {vote_hash[:16]}...\n The vote is encrypted and stored in the secure ledger."
@@ -225,24 +331,36 @@ def confirmation():
         message = "Vote status check."
         details = "Your status is pending or you have already voted."
     
-    return render_template('confirmation.html', message=message, details=details)
+    status_message = CONFIRMATION_STATUS_MESSAGES.get(request.args.get('status'))
+    
+    return render_template('confirmation.html', message=message, details=details,
+                           status_message=status_message)
 
 # ============ ADMIN PANEL ============
 
 @app.route('/admin')
 def admin():
     """Admin panel for viewing stats and tallying results"""
-    return render_template('admin.html')
+    return render_static_page('admin.html')
 
 
 # ============ API PROXY ROUTES (to avoid CORS) ============
 
+def stream_proxy_response(response):
+    """Pass a backend response body through in chunks without re-parsing it"""
+    return Response(
+        response.iter_content(chunk_size=8192),
+        status=response.status_code,
+        content_type=response.headers.get('Content-Type', 'application/json')
+    )
+
+
 @app.route('/api/ledger', methods=['GET'])
 def api_ledger():
     """Proxy to storage service ledger endpoint"""
     try:
-        response = requests.get(f"{STORAGE_API_URL}/ledger", timeout=5)
-        return jsonify(response.json()), response.status_code
+        response = API_SESSION.get(f"{STORAGE_API_URL}/ledger", timeout=5, stream=True)
+        return stream_proxy_response(response)
     except requests.exceptions.RequestException as e:
         print(f"Error connecting to storage service: {e}")
         return jsonify({
@@ -255,8 +373,8 @@ def api_ledger():
 def api_results():
     """Proxy to storage service results endpoint"""
     try:
-        response = requests.get(f"{STORAGE_API_URL}/get_results", timeout=5)
-        return jsonify(response.json()), response.status_code
+        response = API_SESSION.get(f"{STORAGE_API_URL}/get_results", timeout=5, stream=True)
+        return stream_proxy_response(response)
     except requests.exceptions.RequestException as e:
         print(f"Error connecting to storage service: {e}")
         return jsonify({
@@ -270,7 +388,7 @@ def api_tally():
     """Proxy to storage service tally endpoint"""
     try:
         data = request.get_json()
-        response = requests.post(
+        response = API_SESSION.post(
             f"{STORAGE_API_URL}/tally_results",
             json=data,
             timeout=120  # Longer timeout for tallying
@@ -284,11 +402,25 @@ def api_tally():
         }), 503
 
 
+@app.route('/api/tally/<job_id>', methods=['GET'])
+def api_tally_job(job_id):
+    """Proxy to storage service async tally job status"""
+    try:
+        response = API_SESSION.get(f"{STORAGE_API_URL}/tally_results/{job_id}", timeout=5)
+        return jsonify(response.json()), response.status_code
+    except requests.exceptions.RequestException as e:
+        print(f"Error connecting to storage service: {e}")
+        return jsonify({
+            "success": False,
+            "error": f"Storage service unavailable: {str(e)}"
+        }), 503
+
+
 @app.route('/api/tally_status', methods=['GET'])
 def api_tally_status():
     """NEW: Proxy to storage service tally status endpoint"""
     try:
-        response = requests.get(f"{STORAGE_API_URL}/tally_status", timeout=5)
+        response = API_SESSION.get(f"{STORAGE_API_URL}/tally_status", timeout=5)
         return jsonify(response.json()), response.status_code
     except requests.exceptions.RequestException as e:
         print(f"Error connecting to storage service: {e}")
@@ -301,8 +433,44 @@ def api_tally_status():
         }), 503
 
 
+@app.route('/api/tally_status_stream', methods=['GET'])
+def api_tally_status_stream():
+    """Proxy the storage service's Server-Sent Events tally status stream"""
+    if LOCAL_STATUS_STREAM is not None:
+        return LOCAL_STATUS_STREAM()
+    
+    try:
+        response = API_SESSION.get(
+            f"{STORAGE_API_URL}/tally_status_stream",
+            stream=True,
+            timeout=(5, STATUS_STREAM_READ_TIMEOUT)
+        )
+    except requests.exceptions.RequestException as e:
+        print(f"Error connecting to storage service: {e}")
+        return jsonify({"error": "Storage service unavailable"}), 503
+    
+    def relay():
+        close_at = time.monotonic() + STATUS_STREAM_MAX_SECONDS
+        try:
+            for chunk in response.iter_content(chunk_size=None):
+                yield chunk
+                if time.monotonic() >= close_at:
+                    break
+        except requests.exceptions.RequestException:
+            pass  # Storage went quiet or away; the client reconnects
+        finally:
+            response.close()
+    
+    return Response(
+        stream_with_context(relay()),
+        status=response.status_code,
+        content_type=response.headers.get('Content-Type', 'text/event-stream'),
+        headers={'Cache-Control': 'no-cache'}
+    )
+
+init_user_db()
+
 if __name__ == '__main__':
-    load_users()
     
     print("="*60)
     print("Frontend & Authentication Service")
@@ -311,4 +479,5 @@ if __name__ == '__main__':
     print("Admin Panel: http://127.0.0.1:5000/admin")
     print("="*60)
     
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    # Debug mode (reloader + debugger middleware) is opt-in via FLASK_DEBUG=1
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1', port=5000)
\ No newline at end of file
@@ -0,0 +1,49 @@
+# ---------------------------------------------------------------
+# Combined Single-Process Deployment
+# Serves the frontend, encryption and storage services from one process
+# Frontend at /, encryption at /enc, storage at /stor (default port 5000)
+# ---------------------------------------------------------------
+
+import os
+
+PORT = int(os.environ.get("COMBINED_PORT", 5000))
+BASE_URL = f"http://127.0.0.1:{PORT}"
+
+# Point the services at their mount points before they are imported
+os.environ.setdefault("ENCRYPTION_API_URL", f"{BASE_URL}/enc")
+os.environ.setdefault("STORAGE_API_URL", f"{BASE_URL}/stor")
+
+from werkzeug.middleware.dispatcher import DispatcherMiddleware
+from werkzeug.serving import run_simple
+
+import encryption_service
+import storage_service
+import app as frontend
+
+# The vote path and the admin status stream are plain function calls: a
+# submission is frontend -> encryption -> storage in one thread, with no
+# HTTP + JSON round trip back into this process
+encryption_service.LOCAL_STORE = storage_service.handle_store_vote
+frontend.LOCAL_ENCRYPT_AND_STORE = encryption_service.handle_encrypt_and_store
+frontend.LOCAL_STATUS_STREAM = storage_service.tally_status_stream
+
+# WSGI entry point, e.g. `gunicorn -w 1 -k gthread --threads 32 combined:application`.
+# Keep a single worker: tally state and vote receipts live in process memory.
+# The remaining admin API proxies (/api/tally, /api/results, /api/ledger,
+# /api/tally_status) still call back over HTTP, briefly holding a second
+# thread; each open admin tab holds one thread for its status stream (closed
+# and reconnected every 5 minutes). Size --threads with room for both.
+application = DispatcherMiddleware(frontend.app, {
+    "/enc": encryption_service.app,
+    "/stor": storage_service.app,
+})
+
+
+if __name__ == "__main__":
+    print("="*60)
+    print("E-Voting System (combined) Starting...")
+    print(f"Main Application: {BASE_URL}")
+    print(f"Encryption API:   {BASE_URL}/enc")
+    print(f"Storage API:      {BASE_URL}/stor")
+    print("="*60)
+    run_simple("127.0.0.1", PORT, application, threaded=True)
@@ -4,37 +4,46 @@
 # ---------------------------------------------------------------
 
 import time
+import matplotlib
+matplotlib.use('Agg')  # Headless backend: graphs are only written to files
 import matplotlib.pyplot as plt
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import padding as sym_padding
 import os
-import json
+import fast_json
 
 os.makedirs('outputs/analysis', exist_ok=True)
 os.makedirs('outputs/graphs', exist_ok=True)
 
+RESULTS_PATH = os.path.join("outputs", "analysis", "cryptanalysis_results.json")
+_BACKEND = default_backend()
+
 # ============ Module 1: AES Encryption ============
 
 WEAK_KEY = b'0123456789ABCDEF'  # Fixed 16-byte key (128-bit AES)
 WEAK_IV = b'FEDCBA9876543210'   # Fixed IV (insecure!)
 
+# Key and IV never change, so the mode, padding and cipher objects are
+# built once and reused; only the per-call encryptor/padder contexts are new
+_WEAK_MODE = modes.CBC(WEAK_IV)
+_PKCS7 = sym_padding.PKCS7(128)
+_WEAK_CIPHER = Cipher(
+    algorithms.AES(WEAK_KEY),
+    _WEAK_MODE,
+    backend=_BACKEND
+)
+
 def weak_encrypt(plaintext):
     """
     Encrypt data using AES-128-CBC with a FIXED key and IV
     This is INTENTIONALLY WEAK for demonstration purposes
     """
     # Pad the plaintext to multiple of 16 bytes
-    padder = sym_padding.PKCS7(128).padder()
+    padder = _PKCS7.padder()
     padded_data = padder.update(plaintext.encode()) + padder.finalize()
     
-    # Create cipher
-    cipher = Cipher(
-        algorithms.AES(WEAK_KEY),
-        modes.CBC(WEAK_IV),
-        backend=default_backend()
-    )
-    encryptor = cipher.encryptor()
+    encryptor = _WEAK_CIPHER.encryptor()
     
     # Encrypt
     ciphertext = encryptor.update(padded_data) + encryptor.finalize()
@@ -42,18 +51,13 @@ def weak_encrypt(plaintext):
 
 def weak_decrypt(ciphertext):
     """Decrypt weak AES encryption"""
-    cipher = Cipher(
-        algorithms.AES(WEAK_KEY),
-        modes.CBC(WEAK_IV),
-        backend=default_backend()
-    )
-    decryptor = cipher.decryptor()
+    decryptor = _WEAK_CIPHER.decryptor()
     
     # Decrypt
     padded_plaintext = decryptor.update(ciphertext) + decryptor.finalize()
     
     # Unpad
-    unpadder = sym_padding.PKCS7(128).unpadder()
+    unpadder = _PKCS7.unpadder()
     plaintext = unpadder.update(padded_plaintext) + unpadder.finalize()
     
     return plaintext.decode()
@@ -67,23 +71,33 @@ def brute_force_weak_key(ciphertext, known_plaintext_fragment="vote"):
     This simulates the concept by trying a small keyspace
     """
     print("🔓 Attempting brute force attack on weak encryption...")
-    start_time = time.time()
+    # perf_counter is monotonic and high resolution, unlike time.time()
+    start_time = time.perf_counter()
     
-    # Simulate trying keys (in reality, this would be billions of attempts)
-    # For demo: try 1000 "wrong" keys then the correct one
+    # Try a small keyspace for real (in reality, this would be billions of attempts)
+    # For demo: try 1000 "wrong" keys then the correct one. Each guess only
+    # decrypts the first block and checks it for the known plaintext.
     attempts = 0
+    first_block = ciphertext[:16]
+    fragment = known_plaintext_fragment.encode()
     
     for i in range(1000):
-        # Simulate key guess time (microseconds per attempt)
-        time.sleep(0.0001)
+        decryptor = Cipher(
+            algorithms.AES(i.to_bytes(16, 'big')),
+            _WEAK_MODE,
+            backend=_BACKEND
+        ).decryptor()
         attempts += 1
+        if fragment in decryptor.update(first_block):
+            break
     
     # Try the actual weak key
     try:
         plaintext = weak_decrypt(ciphertext)
-        elapsed = time.time() - start_time
+        elapsed = time.perf_counter() - start_time
         
-        print(f"✅ Weak encryption cracked in {elapsed:.2f} seconds ({attempts} attempts)")
+        print(f"✅ Weak encryption cracked in {elapsed:.4f} seconds ({attempts} attempts)")
+        print(f"   Measured cost: {elapsed / attempts * 1e6:.2f} µs per key guess")
         print(f"   Decrypted: {plaintext[:50]}...")
         
         return elapsed, plaintext
@@ -101,7 +115,7 @@ def attack_time_locked_encryption(time_lock_seconds=10):
     print(f"🔐 Attempting to break time-locked encryption...")
     print(f"   Time lock duration: {time_lock_seconds} seconds")
     
-    start_time = time.time()
+    start_time = time.perf_counter()
     
     # Simulate attacker trying to decrypt early (FAILS)
     print("   ❌ Early decryption attempts: BLOCKED by time-lock puzzle")
@@ -110,7 +124,7 @@ def attack_time_locked_encryption(time_lock_seconds=10):
     # Must wait for the time-lock
     time.sleep(time_lock_seconds)
     
-    elapsed = time.time() - start_time
+    elapsed = time.perf_counter() - start_time
     
     print(f"   ✅ Time-lock expired after {elapsed:.2f} seconds")
     print(f"   Decryption now possible")
@@ -170,14 +184,14 @@ def run_cryptanalysis_comparison():
         }
     }
     
-    print(f"\nWeak Encryption Attack Time: {weak_attack_time:.2f}s")
+    print(f"\nWeak Encryption Attack Time: {weak_attack_time:.4f}s")
     print(f"Time-Locked Attack Time: {time_lock_attack_time:.2f}s")
     print(f"Time-Lock Advantage: {results['comparison']['time_difference_seconds']:.2f}s longer")
     print(f"Security Multiplier: {results['comparison']['time_lock_multiplier']:.2f}x")
     
     # Save results
-    with open(os.path.join("outputs", "analysis", "cryptanalysis_results.json"), "w") as f:
-        json.dump(results, f, indent=4)
+    with open(RESULTS_PATH, "wb") as f:
+        fast_json.dump(results, f, indent=True)
     
     print("\n✅ Results saved to cryptanalysis_results.json")
     
@@ -185,6 +199,17 @@ def run_cryptanalysis_comparison():
 
 # ============ Module 5: Visualization ============
 
+# Shared styling for every chart, applied once instead of per artist
+plt.rcParams.update({
+    'font.weight': 'bold',
+    'axes.titleweight': 'bold',
+    'axes.labelweight': 'bold'
+})
+
+# Static scores for the security level chart (out of 100)
+SECURITY_LEVELS = ['Weak AES', 'Time-Locked RSA']
+SECURITY_SCORES = [30, 95]
+
 def generate_comparison_graphs():
     """
     Generate graphs comparing weak vs time-locked encryption
@@ -194,8 +219,8 @@ def generate_comparison_graphs():
     # Load results
     try:
         # FIX: Corrected path to include the outputs/analysis directory
-        with open(os.path.join("outputs", "analysis", "cryptanalysis_results.json"), "r") as f:
-            results = json.load(f)
+        with open(RESULTS_PATH, "rb") as f:
+            results = fast_json.load(f)
     except FileNotFoundError:
         print("❌ Run cryptanalysis first to generate data")
         return
@@ -203,8 +228,14 @@ def generate_comparison_graphs():
     weak_time = results["weak_encryption"]["attack_time_seconds"]
     timelock_time = results["time_locked_encryption"]["attack_time_seconds"]
     
-    # Graph 1: Bar chart comparison
-    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
+    # Attack time, security level and timeline panels share one figure so
+    # layout and rasterization happen once
+    fig, axes = plt.subplot_mosaic(
+        [['attack', 'security'], ['timeline', 'timeline']],
+        figsize=(14, 12),
+        layout='constrained'
+    )
+    ax1, ax2, ax = axes['attack'], axes['security'], axes['timeline']
     
     # Attack time comparison
     methods = ['Weak AES\n(Fixed Key)', 'Time-Locked\nRSA-2048']
@@ -212,59 +243,48 @@ def generate_comparison_graphs():
     colors = ['#ff6b6b', '#51cf66']
     
     ax1.bar(methods, times, color=colors, alpha=0.7, edgecolor='black', linewidth=2)
-    ax1.set_ylabel('Attack Time (seconds)', fontsize=12, fontweight='bold')
-    ax1.set_title('Decryption Attack Time Comparison', fontsize=14, fontweight='bold')
+    ax1.set_ylabel('Attack Time (seconds)', fontsize=12)
+    ax1.set_title('Decryption Attack Time Comparison', fontsize=14)
     ax1.grid(axis='y', alpha=0.3)
     
     for i, (method, time_val) in enumerate(zip(methods, times)):
         ax1.text(i, time_val + 0.2, f'{time_val:.2f}s', 
-                ha='center', va='bottom', fontsize=11, fontweight='bold')
+                ha='center', va='bottom', fontsize=11)
     
     # Security level visualization
-    security_levels = ['Weak AES', 'Time-Locked RSA']
-    security_scores = [30, 95]  # Out of 100
-    
-    ax2.barh(security_levels, security_scores, color=colors, alpha=0.7, edgecolor='black', linewidth=2)
-    ax2.set_xlabel('Security Score (0-100)', fontsize=12, fontweight='bold')
-    ax2.set_title('Security Level Comparison', fontsize=14, fontweight='bold')
+    ax2.barh(SECURITY_LEVELS, SECURITY_SCORES, color=colors, alpha=0.7, edgecolor='black', linewidth=2)
+    ax2.set_xlabel('Security Score (0-100)', fontsize=12)
+    ax2.set_title('Security Level Comparison', fontsize=14)
     ax2.set_xlim(0, 100)
     ax2.grid(axis='x', alpha=0.3)
     
-    for i, (level, score) in enumerate(zip(security_levels, security_scores)):
+    for i, (level, score) in enumerate(zip(SECURITY_LEVELS, SECURITY_SCORES)):
         ax2.text(score + 2, i, f'{score}/100', 
-                va='center', fontsize=11, fontweight='bold')
-    
-    plt.tight_layout()
-    plt.savefig(os.path.join('outputs', 'graphs', 'cryptanalysis_comparison.png'), dpi=300, bbox_inches='tight')
-    print("✅ Graph saved: cryptanalysis_comparison.png")
-    
-    # Graph 2: Time progression
-    fig, ax = plt.subplots(figsize=(10, 6))
+                va='center', fontsize=11)
     
+    # Time progression
     time_steps = [0, weak_time, timelock_time]
     labels = ['Start', 'Weak AES\nCracked', 'Time-Lock\nExpired']
     
     ax.plot(time_steps, [1, 1, 1], 'o-', markersize=15, linewidth=3, color='#4CAF50')
     
     for i, (t, label) in enumerate(zip(time_steps, labels)):
-        ax.text(t, 1.05, label, ha='center', fontsize=11, fontweight='bold')
+        ax.text(t, 1.05, label, ha='center', fontsize=11)
         ax.axvline(x=t, color='gray', linestyle='--', alpha=0.3)
     
     ax.fill_betweenx([0.95, 1.05], 0, weak_time, alpha=0.3, color='red', label='Vulnerable Period (Weak)')
     ax.fill_betweenx([0.95, 1.05], weak_time, timelock_time, alpha=0.3, color='green', label='Protected Period (Time-Lock)')
     
-    ax.set_xlabel('Time (seconds)', fontsize=12, fontweight='bold')
-    ax.set_title('Attack Timeline Comparison', fontsize=14, fontweight='bold')
+    ax.set_xlabel('Time (seconds)', fontsize=12)
+    ax.set_title('Attack Timeline Comparison', fontsize=14)
     ax.set_ylim(0.9, 1.1)
     ax.set_yticks([])
     ax.legend(loc='upper right', fontsize=10)
     ax.grid(axis='x', alpha=0.3)
     
-    plt.tight_layout()
-    plt.savefig(os.path.join('outputs', 'graphs', 'attack_timeline.png'), dpi=300, bbox_inches='tight')
-    print("✅ Graph saved: attack_timeline.png")
-    
-    plt.show()
+    fig.savefig(os.path.join('outputs', 'graphs', 'cryptanalysis_comparison.png'), dpi=150)
+    plt.close(fig)
+    print("✅ Graph saved: cryptanalysis_comparison.png")
 
 # ============ Main Execution ============
 
@@ -284,5 +304,4 @@ if __name__ == "__main__":
     print("="*60)
     print("\nGenerated files:")
     print("  - cryptanalysis_results.json")
-    print("  - cryptanalysis_comparison.png")
-    print("  - attack_timeline.png")
\ No newline at end of file
+    print("  - cryptanalysis_comparison.png")
\ No newline at end of file
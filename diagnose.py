@@ -5,22 +5,60 @@ Checks all services and identifies issues
 """
 
 import requests
+from requests.adapters import HTTPAdapter
 import os
+import errno
 import sys
 import socket
+import selectors
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# One keep-alive session shared by every probe in this run
+HTTP_SESSION = requests.Session()
+HTTP_SESSION.mount('http://', HTTPAdapter(pool_maxsize=4))
 
 def print_header(text):
     print("\n" + "=" * 70)
     print(f"  {text}")
     print("=" * 70)
 
-def check_port_available(port):
-    """Check if a port is available or in use"""
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.settimeout(2)
-    result = sock.connect_ex(('127.0.0.1', port))
-    sock.close()
-    return result == 0  # True if port is in use (service is running)
+def check_ports_in_use(ports, timeout=1.0):
+    """
+    Check several ports at once using non-blocking connects
+    Returns the set of ports that accepted a connection (service is running)
+    """
+    sel = selectors.DefaultSelector()
+    in_use = set()
+    
+    for port in ports:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        result = sock.connect_ex(('127.0.0.1', port))
+        if result == 0:
+            in_use.add(port)
+            sock.close()
+        elif result in (errno.EINPROGRESS, errno.EWOULDBLOCK):
+            sel.register(sock, selectors.EVENT_WRITE, port)
+        else:
+            sock.close()
+    
+    deadline = time.monotonic() + timeout
+    while sel.get_map():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        for key, _ in sel.select(timeout=remaining):
+            if key.fileobj.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                in_use.add(key.data)
+            sel.unregister(key.fileobj)
+            key.fileobj.close()
+    
+    for key in list(sel.get_map().values()):
+        key.fileobj.close()
+    sel.close()
+    
+    return in_use
 
 def check_file_exists(filename):
     """Check if a required file exists"""
@@ -36,13 +74,27 @@ def check_directory_exists(dirname):
     print(f"   {dirname}/: {status}")
     return exists
 
-def test_service_health(url, service_name):
+def fetch_service_health(url, method='GET'):
+    """
+    Fetch a health URL, returning the response or the raised exception
+    Use method='HEAD' for pure liveness checks that don't need a body
+    """
+    try:
+        return HTTP_SESSION.request(method, url, timeout=3, allow_redirects=True)
+    except Exception as e:
+        return e
+
+def test_service_health(url, service_name, response=None):
     """Test if a service is responding"""
+    if response is None:
+        response = fetch_service_health(url)
     try:
-        response = requests.get(url, timeout=3)
+        if isinstance(response, Exception):
+            raise response
         if response.status_code == 200:
             print(f"   ✅ {service_name} is responding")
-            print(f"      Status: {response.json()}")
+            if response.request.method != 'HEAD':
+                print(f"      Status: {response.json()}")
             return True
         else:
             print(f"   ⚠️  {service_name} responded with status {response.status_code}")
@@ -114,8 +166,9 @@ def main():
     }
     
     running_services = []
+    ports_in_use = check_ports_in_use(ports)
     for port, name in ports.items():
-        if check_port_available(port):
+        if port in ports_in_use:
             print(f"   ✅ Port {port} ({name}) - IN USE (service running)")
             running_services.append(port)
         else:
@@ -125,14 +178,24 @@ def main():
     if running_services:
         print_header("5. Testing Service Health")
         
-        if 5001 in running_services:
-            test_service_health("http://127.0.0.1:5001/health", "Encryption Service")
+        # The main app has no health endpoint, so a HEAD request checks liveness
+        health_checks = [
+            (5001, "http://127.0.0.1:5001/health", "Encryption Service", 'GET'),
+            (5002, "http://127.0.0.1:5002/health", "Storage Service", 'GET'),
+            (5000, "http://127.0.0.1:5000/", "Main Application", 'HEAD')
+        ]
+        health_checks = [check for check in health_checks if check[0] in running_services]
         
-        if 5002 in running_services:
-            test_service_health("http://127.0.0.1:5002/health", "Storage Service")
+        # Query all services concurrently, then report in a stable order
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            responses = list(pool.map(
+                fetch_service_health,
+                [url for _, url, _, _ in health_checks],
+                [method for _, _, _, method in health_checks]
+            ))
         
-        if 5000 in running_services:
-            test_service_health("http://127.0.0.1:5000/", "Main Application")
+        for (_, url, name, _), response in zip(health_checks, responses):
+            test_service_health(url, name, response)
     else:
         print_header("5. Service Health")
         print("   ⚠️  No services are currently running")
@@ -149,7 +212,7 @@ def main():
                 "candidate": "A",
                 "timestamp": "2025-10-30 12:00:00"
             }
-            response = requests.post("http://127.0.0.1:5001/encrypt_vote", json=test_data, timeout=5)
+            response = HTTP_SESSION.post("http://127.0.0.1:5001/encrypt_vote", json=test_data, timeout=5)
             if response.status_code == 200:
                 print("   ✅ Encryption endpoint working")
             else:
@@ -159,7 +222,7 @@ def main():
         
         # Test storage endpoint
         try:
-            response = requests.get("http://127.0.0.1:5002/ledger", timeout=5)
+            response = HTTP_SESSION.get("http://127.0.0.1:5002/ledger", timeout=5)
             if response.status_code == 200:
                 print("   ✅ Storage ledger endpoint working")
                 data = response.json()
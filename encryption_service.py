@@ -7,18 +7,58 @@
 from flask import Flask, request, jsonify
 from cryptography.hazmat.primitives.asymmetric import rsa, padding
 from cryptography.hazmat.primitives import serialization, hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.backends import default_backend
 import base64
+import binascii
+import hashlib
+import math
+import threading
+from concurrent.futures import ProcessPoolExecutor
 import os
+import fast_json
 os.makedirs('keys', exist_ok=True)
 import time
-import requests # Still needed for decrypt_vote if used directly
+from datetime import datetime, timezone
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Optional: msgpack bodies for the encryption -> storage hop (JSON otherwise)
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
 app = Flask(__name__)
+# jsonify() and request.get_json() go through orjson when it is installed
+app.json = fast_json.FastJSONProvider(app)
 
 # File paths for RSA keys
 PRIVATE_KEY_FILE = os.path.join("keys", "private_key.pem")
 PUBLIC_KEY_FILE = os.path.join("keys", "public_key.pem")
+# Per-election AES-256 vote key, stored wrapped with the RSA public key
+SESSION_KEY_FILE = os.path.join("keys", "session.bin")
+
+# Hybrid ciphertexts are encoded as "aesgcm:<kid>:<base64(nonce || ciphertext)>";
+# anything else is treated as a legacy per-vote RSA-OAEP ciphertext
+HYBRID_PREFIX = "aesgcm"
+GCM_NONCE_SIZE = 12
+
+# Storage service that /encrypt_and_store forwards encrypted votes to
+STORAGE_API_URL = os.environ.get("STORAGE_API_URL", "http://127.0.0.1:5002")
+
+# When the services share a process (combined.py), votes are handed to the
+# storage service with a direct call instead of an HTTP round trip
+LOCAL_STORE = None
+
+# Shared HTTP session: keeps connections to the storage service alive
+STORAGE_SESSION = requests.Session()
+STORAGE_SESSION.mount('http://', HTTPAdapter(
+    pool_connections=1,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.1)
+))
 
 
 # ============ Module 1: Key Generation ============
@@ -85,52 +125,183 @@ def load_public_key():
     return public_key
 
 
+# Parsed key objects, re-parsed only when the PEM file's mtime changes
+_PUBLIC_KEY = None
+_PRIVATE_KEY = None
+_KEY_MTIMES = {}
+_KEY_LOCK = threading.Lock()
+
+
+def get_private_key():
+    """Return the cached private key, reloading it if the PEM file changed"""
+    global _PRIVATE_KEY
+    mtime = os.stat(PRIVATE_KEY_FILE).st_mtime_ns
+    if _PRIVATE_KEY is None or _KEY_MTIMES.get(PRIVATE_KEY_FILE) != mtime:
+        with _KEY_LOCK:
+            if _PRIVATE_KEY is None or _KEY_MTIMES.get(PRIVATE_KEY_FILE) != mtime:
+                _PRIVATE_KEY = load_private_key()
+                _KEY_MTIMES[PRIVATE_KEY_FILE] = mtime
+    return _PRIVATE_KEY
+
+
+def get_public_key():
+    """Return the cached public key, reloading it if the PEM file changed"""
+    global _PUBLIC_KEY
+    mtime = os.stat(PUBLIC_KEY_FILE).st_mtime_ns
+    if _PUBLIC_KEY is None or _KEY_MTIMES.get(PUBLIC_KEY_FILE) != mtime:
+        with _KEY_LOCK:
+            if _PUBLIC_KEY is None or _KEY_MTIMES.get(PUBLIC_KEY_FILE) != mtime:
+                _PUBLIC_KEY = load_public_key()
+                _KEY_MTIMES[PUBLIC_KEY_FILE] = mtime
+    return _PUBLIC_KEY
+
+
+# OAEP/MGF1 parameters are immutable, so one instance serves every request.
+# SHA-256 is kept on purpose: SHA-1 OAEP would save little next to the modexp.
+OAEP_PADDING = padding.OAEP(
+    mgf=padding.MGF1(algorithm=hashes.SHA256()),
+    algorithm=hashes.SHA256(),
+    label=None
+)
+
+# OpenSSL build backing 'cryptography' (RSA-CRT and the bignum fast paths live here)
+OPENSSL_VERSION = default_backend().openssl_version_text()
+
+
+# Session key state: the raw key only ever lives in process memory
+_SESSION_KEY = None
+_SESSION_KID = None
+_SESSION_KEY_LOCK = threading.Lock()
+
+
+def init_session_key():
+    """
+    Load the election's AES-256 vote key, creating it on first use
+    The key is RSA-OAEP wrapped once and saved to SESSION_KEY_FILE, so the
+    expensive RSA operation happens once per election instead of per vote.
+    Returns (key, kid) where kid identifies the wrapped key.
+    """
+    global _SESSION_KEY, _SESSION_KID
+    with _SESSION_KEY_LOCK:
+        if _SESSION_KEY is None:
+            if os.path.exists(SESSION_KEY_FILE):
+                with open(SESSION_KEY_FILE, "rb") as f:
+                    wrapped_key = f.read()
+                session_key = get_private_key().decrypt(wrapped_key, OAEP_PADDING)
+            else:
+                session_key = AESGCM.generate_key(bit_length=256)
+                wrapped_key = get_public_key().encrypt(session_key, OAEP_PADDING)
+                with open(SESSION_KEY_FILE, "wb") as f:
+                    f.write(wrapped_key)
+                print(f"✅ Election vote key generated: {SESSION_KEY_FILE}")
+            
+            _SESSION_KID = hashlib.sha256(wrapped_key).hexdigest()[:16]
+            _SESSION_KEY = session_key
+        
+        return _SESSION_KEY, _SESSION_KID
+
+
 # Generate keys on startup
 try:
     generate_keys()
+    get_public_key()
+    get_private_key()
+    init_session_key()
 except Exception as e:
     print(f"❌ Error generating keys: {e}")
 
 
 # ============ Module 2: Vote Encryption ============
 def encrypt_vote_data(vote_text):
-    # ... (Encryption code remains unchanged) ...
-    """Encrypt a vote using RSA public key"""
+    """
+    Encrypt a vote with AES-256-GCM under the RSA-wrapped election key
+    Returns the "aesgcm:<kid>:<base64>" token stored in the ledger.
+    """
     try:
-        public_key = load_public_key()
+        session_key, kid = init_session_key()
         
-        # Encrypt the vote
-        encrypted_vote = public_key.encrypt(
-            vote_text.encode(),
-            padding.OAEP(
-                mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                algorithm=hashes.SHA256(),
-                label=None
-            )
-        )
+        nonce = os.urandom(GCM_NONCE_SIZE)
+        ciphertext = AESGCM(session_key).encrypt(nonce, vote_text.encode(), None)
         
         # Convert bytes to base64 for JSON transmission
-        encrypted_vote_b64 = base64.b64encode(encrypted_vote).decode('utf-8')
+        encrypted_vote_b64 = base64.b64encode(nonce + ciphertext).decode('utf-8')
         
-        return encrypted_vote_b64
+        return f"{HYBRID_PREFIX}:{kid}:{encrypted_vote_b64}"
     
     except Exception as e:
         raise Exception(f"Encryption error: {str(e)}")
 
 
-# ============ Module 3: Time Lock (Function is now redundant but kept for API structure) ============
-def time_lock(delay_seconds=10):
-    """Simulate time-lock delay before decryption"""
-    print(f"⏳ Time lock active for {delay_seconds} seconds...")
-    time.sleep(delay_seconds)
-    print("✅ Time lock completed")
+# ============ Module 3: Time Lock (Deadline check, no longer blocks a worker thread) ============
+# The deadline is derived from the vote itself (its cast timestamp plus the
+# delay), so every worker, and a restarted service, agrees on it.
+
+
+def _as_seconds(value, name):
+    """Validate a client-supplied time value, raising ValueError if not numeric"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(f"{name} must be a number")
+    return float(value)
+
+
+def time_lock_params(data):
+    """Read (delay_seconds, unlock_at) from a request body, raising ValueError if invalid"""
+    delay_seconds = max(0.0, _as_seconds(data.get('time_lock_seconds', 10), "time_lock_seconds"))
+    unlock_at = data.get('unlock_at')
+    if unlock_at is not None:
+        unlock_at = _as_seconds(unlock_at, "unlock_at")
+    return delay_seconds, unlock_at
+
+
+def time_lock(decrypted_vote, delay_seconds=10, unlock_at=None):
+    """
+    Return the epoch time at which a decrypted vote may be released
+    That is the vote's UTC timestamp plus delay_seconds; a client-supplied
+    unlock_at can only push it later. Raises ValueError if the vote has no
+    valid timestamp.
+    """
+    timestamp = decrypted_vote.rsplit('|', 1)[-1]
+    try:
+        cast_at = datetime.fromisoformat(timestamp)
+    except ValueError:
+        raise ValueError("Vote has no valid timestamp")
+    if cast_at.tzinfo is None:
+        cast_at = cast_at.replace(tzinfo=timezone.utc)
+    
+    not_before = cast_at.timestamp() + delay_seconds
+    if unlock_at is None:
+        return not_before
+    return max(unlock_at, not_before)
+
+
+def too_early_response(unlock_at, remaining):
+    """425 Too Early response telling the client when to retry"""
+    response = jsonify({
+        "success": False,
+        "error": "Time lock still active",
+        "unlock_at": unlock_at,
+        "retry_after": round(remaining, 3)
+    })
+    response.headers["Retry-After"] = str(math.ceil(remaining))
+    return response, 425
 
 
 # ============ Module 4: Vote Decryption (Now primarily for testing/single-vote checks) ============
 def decrypt_vote_data(encrypted_vote_b64):
-    """Decrypt an encrypted vote using RSA private key"""
+    """Decrypt an encrypted vote (hybrid AES-GCM, or legacy RSA-OAEP)"""
     try:
-        private_key = load_private_key()
+        if encrypted_vote_b64.startswith(HYBRID_PREFIX + ":"):
+            _, kid, payload_b64 = encrypted_vote_b64.split(":", 2)
+            session_key, current_kid = init_session_key()
+            if kid != current_kid:
+                raise ValueError(f"Unknown election key id {kid}")
+            
+            # a2b_base64 skips b64decode's Python-level argument handling
+            payload = binascii.a2b_base64(payload_b64)
+            nonce, ciphertext = payload[:GCM_NONCE_SIZE], payload[GCM_NONCE_SIZE:]
+            return AESGCM(session_key).decrypt(nonce, ciphertext, None).decode()
+        
+        private_key = get_private_key()
         
         # Convert base64 back to bytes
         encrypted_vote = base64.b64decode(encrypted_vote_b64)
@@ -138,11 +309,7 @@ def decrypt_vote_data(encrypted_vote_b64):
         # Decrypt the vote
         decrypted_vote = private_key.decrypt(
             encrypted_vote,
-            padding.OAEP(
-                mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                algorithm=hashes.SHA256(),
-                label=None
-            )
+            OAEP_PADDING
         )
         
         return decrypted_vote.decode()
@@ -151,6 +318,44 @@ def decrypt_vote_data(encrypted_vote_b64):
         raise Exception(f"Decryption error: {str(e)}")
 
 
+# ============ Module 5: Batch Decryption ============
+# Batches smaller than this are decrypted in-thread; the pool's IPC isn't worth it
+BATCH_PARALLEL_THRESHOLD = 64
+BATCH_CHUNK_SIZE = 32
+# Pool processes per service process. Under N gunicorn workers start.py sets
+# this to cores // N, so the workers' pools together use each core once.
+DECRYPT_POOL_WORKERS = max(1, int(os.environ.get("DECRYPT_POOL_WORKERS", os.cpu_count() or 1)))
+
+_DECRYPT_POOL = None
+_DECRYPT_POOL_LOCK = threading.Lock()
+
+
+def get_decrypt_pool():
+    """Create the decryption process pool on first use"""
+    global _DECRYPT_POOL
+    with _DECRYPT_POOL_LOCK:
+        if _DECRYPT_POOL is None:
+            _DECRYPT_POOL = ProcessPoolExecutor(max_workers=DECRYPT_POOL_WORKERS)
+        return _DECRYPT_POOL
+
+
+def _decrypt_batch_item(encrypted_vote_b64):
+    """Decrypt one batch entry, reporting failures instead of raising"""
+    try:
+        return {"success": True, "decrypted_vote": decrypt_vote_data(encrypted_vote_b64)}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+def decrypt_vote_batch(encrypted_votes):
+    """Decrypt a list of votes, fanning large batches out across processes"""
+    if DECRYPT_POOL_WORKERS == 1 or len(encrypted_votes) < BATCH_PARALLEL_THRESHOLD:
+        return [_decrypt_batch_item(vote) for vote in encrypted_votes]
+    
+    pool = get_decrypt_pool()
+    return list(pool.map(_decrypt_batch_item, encrypted_votes, chunksize=BATCH_CHUNK_SIZE))
+
+
 # ============ Flask Routes ============
 
 @app.route('/encrypt_vote', methods=['POST'])
@@ -200,11 +405,95 @@ def encrypt_vote():
         }), 500
 
 
+@app.route('/encrypt_and_store', methods=['POST'])
+def encrypt_and_store():
+    """
+    Endpoint to encrypt a vote and store it in the ledger in one request
+    Saves the frontend a second round trip to the storage service. The
+    'stage' field of a failed response says which step went wrong.
+    """
+    response, status_code = handle_encrypt_and_store(request.get_json(silent=True))
+    return jsonify(response), status_code
+
+
+def handle_encrypt_and_store(data):
+    """
+    Encrypt a vote and store it; returns (response dict, HTTP status)
+    Shared by /encrypt_and_store and in-process callers (see combined.py).
+    """
+    try:
+        if not data:
+            return {
+                "success": False,
+                "stage": "encryption",
+                "error": "No JSON data received"
+            }, 400
+        
+        voter_id = data.get('voter_id')
+        candidate = data.get('candidate')
+        timestamp = data.get('timestamp')
+        
+        if not all([voter_id, candidate, timestamp]):
+            return {
+                "success": False,
+                "stage": "encryption",
+                "error": f"Missing required fields. Got: {list(data.keys())}"
+            }, 400
+        
+        encrypted_vote = encrypt_vote_data(f"{voter_id}|{candidate}|{timestamp}")
+    
+    except Exception as e:
+        print(f"❌ Encryption error: {str(e)}")
+        return {
+            "success": False,
+            "stage": "encryption",
+            "error": str(e)
+        }, 500
+    
+    try:
+        vote_record = {
+            "voter_id": voter_id,
+            "encrypted_vote": encrypted_vote,
+            "timestamp": timestamp
+        }
+        if LOCAL_STORE is not None:
+            storage_result, status_code = LOCAL_STORE(vote_record)
+        elif msgpack is not None:
+            storage_response = STORAGE_SESSION.post(
+                f"{STORAGE_API_URL}/store_vote",
+                data=msgpack.packb(vote_record),
+                headers={"Content-Type": "application/msgpack"},
+                timeout=10
+            )
+        else:
+            storage_response = STORAGE_SESSION.post(
+                f"{STORAGE_API_URL}/store_vote",
+                json=vote_record,
+                timeout=10
+            )
+        
+        if LOCAL_STORE is None:
+            storage_result = storage_response.json()
+            status_code = storage_response.status_code
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"❌ Storage forwarding error: {str(e)}")
+        return {
+            "success": False,
+            "stage": "storage",
+            "error": f"Storage service unavailable: {str(e)}"
+        }, 502
+    
+    print(f"✅ Encrypted and forwarded vote for voter {voter_id}")
+    
+    storage_result["stage"] = "storage"
+    return storage_result, status_code
+
+
 @app.route('/decrypt_vote', methods=['POST'])
 def decrypt_vote():
-    # ... (Decryption endpoint remains unchanged, still includes time-lock simulation) ...
     """
     Endpoint for decrypting votes after time-lock
+    Returns 425 Too Early (with Retry-After) until the vote's deadline passes.
     """
     try:
         data = request.get_json()
@@ -216,7 +505,6 @@ def decrypt_vote():
             }), 400
         
         encrypted_vote = data.get('encrypted_vote')
-        time_lock_seconds = data.get('time_lock_seconds', 10)
         
         if not encrypted_vote:
             return jsonify({
@@ -224,29 +512,46 @@ def decrypt_vote():
                 "error": "Missing encrypted_vote"
             }), 400
         
-        # Apply time lock (Simulation)
-        time_lock(time_lock_seconds)
+        try:
+            delay_seconds, requested_unlock_at = time_lock_params(data)
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
         
-        # Decrypt the vote
+        # Decrypt the vote; nothing from it is returned before the time lock passes
         decrypted_vote = decrypt_vote_data(encrypted_vote)
         
         # Parse the decrypted string
         parts = decrypted_vote.split('|')
-        if len(parts) == 3:
-            voter_id, candidate, timestamp = parts
-            
-            return jsonify({
-                "success": True,
-                "decrypted_vote": decrypted_vote,
-                "voter_id": voter_id,
-                "candidate": candidate,
-                "timestamp": timestamp
-            })
-        else:
+        if len(parts) != 3:
             return jsonify({
                 "success": False,
                 "error": "Invalid vote format"
             }), 400
+        
+        # Apply time lock (Simulation)
+        try:
+            unlock_at = time_lock(decrypted_vote, delay_seconds, requested_unlock_at)
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
+        remaining = unlock_at - time.time()
+        if remaining > 0:
+            return too_early_response(unlock_at, remaining)
+        print("✅ Time lock completed")
+        
+        voter_id, candidate, timestamp = parts
+        return jsonify({
+            "success": True,
+            "decrypted_vote": decrypted_vote,
+            "voter_id": voter_id,
+            "candidate": candidate,
+            "timestamp": timestamp
+        })
     
     except Exception as e:
         print(f"❌ Decryption error: {str(e)}")
@@ -256,6 +561,65 @@ def decrypt_vote():
         }), 500
 
 
+@app.route('/decrypt_batch', methods=['POST'])
+def decrypt_batch():
+    """
+    Endpoint for decrypting many votes at once after a shared time-lock
+    The whole batch unlocks together, like a single /decrypt_vote call.
+    """
+    try:
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({
+                "success": False,
+                "error": "No JSON data received"
+            }), 400
+        
+        encrypted_votes = data.get('encrypted_votes')
+        
+        if not isinstance(encrypted_votes, list) or not all(isinstance(v, str) for v in encrypted_votes):
+            return jsonify({
+                "success": False,
+                "error": "encrypted_votes must be a list of strings"
+            }), 400
+        
+        try:
+            delay_seconds, requested_unlock_at = time_lock_params(data)
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
+        
+        results = decrypt_vote_batch(encrypted_votes)
+        
+        # The batch unlocks when its newest vote does
+        unlock_at = requested_unlock_at or 0.0
+        for i, result in enumerate(results):
+            if result["success"]:
+                try:
+                    unlock_at = max(unlock_at, time_lock(result["decrypted_vote"], delay_seconds))
+                except ValueError as e:
+                    results[i] = {"success": False, "error": str(e)}
+        remaining = unlock_at - time.time()
+        if remaining > 0:
+            return too_early_response(unlock_at, remaining)
+        
+        print(f"✅ Batch decrypted: {sum(r['success'] for r in results)}/{len(results)} votes")
+        return jsonify({
+            "success": True,
+            "results": results
+        })
+    
+    except Exception as e:
+        print(f"❌ Batch decryption error: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
@@ -263,7 +627,8 @@ def health():
         "status": "running",
         "service": "Encryption Service",
         "port": 5001,
-        "library": "cryptography (not pycryptodome)"
+        "library": "cryptography (not pycryptodome)",
+        "openssl": OPENSSL_VERSION
     })
 
 
@@ -275,7 +640,9 @@ def index():
         "status": "running",
         "endpoints": {
             "/encrypt_vote": "POST - Encrypt a vote",
+            "/encrypt_and_store": "POST - Encrypt a vote and store it in the ledger",
             "/decrypt_vote": "POST - Decrypt a vote (with time-lock)",
+            "/decrypt_batch": "POST - Decrypt a list of votes in parallel (with time-lock)",
             "/health": "GET - Health check"
         }
     })
@@ -285,7 +652,8 @@ if __name__ == "__main__":
     print("="*60)
     print("Encryption Service Starting...")
     print("Using 'cryptography' library (Windows-friendly)")
+    print(f"Backed by {OPENSSL_VERSION}")
     print("Running on http://127.0.0.1:5001")
     print("="*60)
     # CRITICAL FIX: Enable threading to handle multiple simultaneous encryption requests
-    app.run(debug=True, port=5001, use_reloader=False, threaded=True)
\ No newline at end of file
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1', port=5001, use_reloader=False, threaded=True)
\ No newline at end of file
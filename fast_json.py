@@ -0,0 +1,56 @@
+# ---------------------------------------------------------------
+# Fast JSON Helpers for the E-Voting Services
+# Uses orjson (C extension) when installed, stdlib json otherwise
+# ---------------------------------------------------------------
+
+import json
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers can
+# keep catching the stdlib exception regardless of the backend in use
+JSONDecodeError = json.JSONDecodeError
+
+
+def dumps(obj, indent=False):
+    """Serialize obj to UTF-8 encoded JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    if indent:
+        return json.dumps(obj, indent=2).encode('utf-8')
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def loads(data):
+    """Parse JSON from bytes or str"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def load(f):
+    """Parse JSON from a file opened in binary mode"""
+    return loads(f.read())
+
+
+def dump(obj, f, indent=False):
+    """Write obj as JSON to a file opened in binary mode"""
+    f.write(dumps(obj, indent=indent))
+
+
+class FastJSONProvider(JSONProvider):
+    """Flask JSON provider that routes jsonify() and request.get_json() through fast_json"""
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj), mimetype="application/json")
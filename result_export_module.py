@@ -4,15 +4,50 @@
 # FIXED VERSION - Corrects JSON keys for CSV export and Summary
 # ---------------------------------------------------------------
 
-import json
 import csv
+import io
+import fast_json
 import hashlib
+import binascii
 from datetime import datetime
 import os
+import shutil
+import tempfile
+
+# Optional: stream the ledger instead of building the whole object graph
+try:
+    import ijson
+except ImportError:
+    ijson = None
 
 os.makedirs('outputs/reports', exist_ok=True)
 os.makedirs('data', exist_ok=True)
 
+
+# ============ Ledger Streaming Helpers ============
+
+def _is_jsonl_ledger(ledger_file):
+    """True for the append-only ledger (one vote per line + a _meta.json file)"""
+    return ledger_file.endswith(".jsonl")
+
+
+def iter_ledger_votes(ledger_file):
+    """Yield the ledger's votes one at a time (streamed when ijson is installed)"""
+    if _is_jsonl_ledger(ledger_file):
+        with open(ledger_file, "rb") as f:
+            for line in f:
+                # Skip a torn final append
+                if line.endswith(b"\n"):
+                    yield fast_json.loads(line)
+        return
+    
+    with open(ledger_file, "rb") as f:
+        if ijson is None:
+            yield from fast_json.load(f).get("votes", [])
+        else:
+            yield from ijson.items(f, "votes.item")
+
+
 # ============ Module 1: Result Export to CSV ============
 def export_results_to_csv(
     results_file=os.path.join("data", "election_results.json"),
@@ -23,33 +58,36 @@ def export_results_to_csv(
     """
     try:
         # Load results
-        with open(results_file, "r") as f:
-            results = json.load(f)
+        with open(results_file, "rb") as f:
+            results = fast_json.load(f)
+        
+        # Create CSV in memory, then write it in one call
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        
+        # Header
+        writer.writerow(["Election Results Export"])
+        writer.writerow(["Generated:", results.get("timestamp", "N/A")])
+        writer.writerow([])
+        
+        # Vote counts
+        writer.writerow(["Candidate", "Votes", "Percentage"])
+        
+        # FIX START: Corrected keys to match the JSON structure from storage_service.py
+        total_votes = results.get("total_votes", 0) 
+        vote_counts = results.get("vote_counts", {})
+        # FIX END
+        
+        for candidate, count in sorted(vote_counts.items()):
+            percentage = (count / total_votes * 100) if total_votes > 0 else 0
+            writer.writerow([candidate, count, f"{percentage:.2f}%"])
+        
+        writer.writerow([])
+        writer.writerow(["Total Votes", total_votes])
+        writer.writerow(["Winner", results.get("winner", "N/A")])
         
-        # Create CSV
         with open(output_file, "w", newline='', encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
-            
-            # Header
-            writer.writerow(["Election Results Export"])
-            writer.writerow(["Generated:", results.get("timestamp", "N/A")])
-            writer.writerow([])
-            
-            # Vote counts
-            writer.writerow(["Candidate", "Votes", "Percentage"])
-            
-            # FIX START: Corrected keys to match the JSON structure from storage_service.py
-            total_votes = results.get("total_votes", 0) 
-            vote_counts = results.get("vote_counts", {})
-            # FIX END
-            
-            for candidate, count in sorted(vote_counts.items()):
-                percentage = (count / total_votes * 100) if total_votes > 0 else 0
-                writer.writerow([candidate, count, f"{percentage:.2f}%"])
-            
-            writer.writerow([])
-            writer.writerow(["Total Votes", total_votes])
-            writer.writerow(["Winner", results.get("winner", "N/A")])
+            csvfile.write(buf.getvalue())
         
         print(f"✅ Results exported to {output_file}")
         return output_file
@@ -64,40 +102,49 @@ def export_results_to_csv(
 
 # ============ Module 2: Detailed Vote Export ============
 
+# Large write buffer so a big ledger export isn't split into many small writes
+CSV_BUFFER_SIZE = 1 << 20
+
 def export_detailed_votes_csv(
-    ledger_file=os.path.join("data", "vote_ledger.json"),
+    ledger_file=os.path.join("data", "vote_ledger.jsonl"),
     output_file=os.path.join("outputs", "reports", "detailed_votes.csv")
 ):
     """
     Export detailed encrypted vote ledger to CSV
     """
     try:
-        with open(ledger_file, "r") as f:
-            ledger = json.load(f)
-        
-        votes = ledger.get("votes", [])
-        
-        with open(output_file, "w", newline='', encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
+        # The vote rows are spooled first so the header can carry the number
+        # actually exported, rather than ledger metadata that may be stale
+        with tempfile.TemporaryFile("w+", newline='', encoding='utf-8', buffering=CSV_BUFFER_SIZE) as rows:
+            count = 0
             
-            # Header
-            writer.writerow(["Vote Ledger Export"])
-            writer.writerow(["Generated:", datetime.now().isoformat()])
-            writer.writerow(["Total Votes:", len(votes)])
-            writer.writerow([])
+            def numbered(votes):
+                nonlocal count
+                for count, vote in enumerate(votes, 1):
+                    yield (
+                        count,
+                        vote.get("voter_id", "N/A"),
+                        vote.get("timestamp", "N/A"),
+                        vote.get("vote_hash", "N/A")[:64],  # First 64 chars of hash
+                        vote.get("encrypted_vote", "N/A")[:50] + "..."  # First 50 chars of ciphertext
+                    )
             
-            # Column headers
-            writer.writerow(["#", "Voter ID", "Timestamp", "Vote Hash (SHA-256)", "Encrypted Vote (First 50 chars)"])
+            # Vote entries (writerows keeps the per-row loop inside the C csv module)
+            csv.writer(rows).writerows(numbered(iter_ledger_votes(ledger_file)))
+            rows.seek(0)
             
-            # Vote entries
-            for idx, vote in enumerate(votes, 1):
-                writer.writerow([
-                    idx,
-                    vote.get("voter_id", "N/A"),
-                    vote.get("timestamp", "N/A"),
-                    vote.get("vote_hash", "N/A")[:64],  # First 64 chars of hash
-                    vote.get("encrypted_vote", "N/A")[:50] + "..."  # First 50 chars of ciphertext
-                ])
+            with open(output_file, "w", newline='', encoding='utf-8', buffering=CSV_BUFFER_SIZE) as csvfile:
+                writer = csv.writer(csvfile)
+                
+                # Header
+                writer.writerow(["Vote Ledger Export"])
+                writer.writerow(["Generated:", datetime.now().isoformat()])
+                writer.writerow(["Total Votes:", count])
+                writer.writerow([])
+                
+                # Column headers
+                writer.writerow(["#", "Voter ID", "Timestamp", "Vote Hash (SHA-256)", "Encrypted Vote (First 50 chars)"])
+                shutil.copyfileobj(rows, csvfile, CSV_BUFFER_SIZE)
         
         print(f"✅ Detailed ledger exported to {output_file}")
         return output_file
@@ -112,16 +159,25 @@ def export_detailed_votes_csv(
 
 # ============ Module 3: Integrity Proof Generation ============
 
+def sha256_file(f):
+    """SHA-256 hex digest of a binary file, read in chunks rather than all at once"""
+    if hasattr(hashlib, "file_digest"):  # Python 3.11+
+        return hashlib.file_digest(f, "sha256").hexdigest()
+    
+    h = hashlib.sha256()
+    for chunk in iter(lambda: f.read(1 << 16), b""):
+        h.update(chunk)
+    return h.hexdigest()
+
+
 def generate_integrity_proof(results_file=os.path.join("data", "election_results.json")):
     """
     Generate cryptographic proof of result integrity
     """
     try:
-        with open(results_file, "r") as f:
-            content = f.read()
-        
         # Calculate SHA-256 hash
-        result_hash = hashlib.sha256(content.encode()).hexdigest()
+        with open(results_file, "rb") as f:
+            result_hash = sha256_file(f)
         
         # Create proof document
         proof = {
@@ -134,8 +190,8 @@ def generate_integrity_proof(results_file=os.path.join("data", "election_results
         
         # Save proof
         proof_file = os.path.join("outputs", "reports", "integrity_proof.json")
-        with open(proof_file, "w") as f:
-            json.dump(proof, f, indent=4)
+        with open(proof_file, "wb") as f:
+            fast_json.dump(proof, f, indent=True)
         
         print(f"✅ Integrity proof generated")
         print(f"   SHA-256: {result_hash}")
@@ -150,90 +206,210 @@ def generate_integrity_proof(results_file=os.path.join("data", "election_results
 
 # ============ Module 4: Blockchain-Style Hash Linking ============
 
-def add_blockchain_style_linking(ledger_file=os.path.join("data", "vote_ledger.json")):
+# The chain lives beside the ledger so linking never rewrites the storage service's file
+CHAIN_FILE = os.path.join("data", "vote_chain.jsonl")
+CHAIN_META_FILE = os.path.join("data", "vote_chain_meta.json")
+
+GENESIS_HASH = b"0" * 64  # Genesis block hash (hex, as bytes)
+
+
+def _vote_fields(vote):
+    """Encode the hashed fields of a vote once: (voter_id, encrypted_vote, timestamp)"""
+    return vote['voter_id'].encode(), vote['encrypted_vote'].encode(), vote['timestamp'].encode()
+
+
+def hash_block_and_leaf(voter_id, encrypted_vote, timestamp, previous_hash):
+    """
+    Hash one block and its Merkle leaf in a single pass over the fields
+    block = SHA-256(voter_id || encrypted_vote || timestamp || previous_hash)
+    leaf  = SHA-256(voter_id || encrypted_vote || timestamp)
+    All arguments are bytes (previous_hash is a hex digest). The leaf is the
+    same prefix, so the hash state is copied rather than re-fed the fields.
+    Returns (block hash as hex bytes, leaf digest).
+    """
+    h = hashlib.sha256(voter_id)
+    h.update(encrypted_vote)
+    h.update(timestamp)
+    leaf = h.copy().digest()
+    h.update(previous_hash)
+    return binascii.hexlify(h.digest()), leaf
+
+
+LEAF_SIZE = 32  # SHA-256 digest size
+
+
+def merkle_root_from_leaves(leaves):
+    """
+    Fold a contiguous buffer of 32-byte leaf digests into the Merkle root (hex)
+    Each level is one bytes object, hashed through memoryview slices.
+    """
+    if not leaves:
+        return None
+    
+    level = bytes(leaves)
+    sha256 = hashlib.sha256
+    while len(level) > LEAF_SIZE:
+        if (len(level) // LEAF_SIZE) % 2:
+            level += level[-LEAF_SIZE:]
+        view = memoryview(level)
+        level = b"".join(
+            sha256(view[i:i + 2 * LEAF_SIZE]).digest() for i in range(0, len(level), 2 * LEAF_SIZE)
+        )
+    
+    return level.hex()
+
+
+def load_chain_meta(meta_file=CHAIN_META_FILE):
+    """Load chain metadata, or None if the ledger has never been linked"""
+    try:
+        with open(meta_file, "rb") as f:
+            return fast_json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_chain_meta(meta, meta_file=CHAIN_META_FILE):
+    """Atomically replace the chain metadata file"""
+    tmp_file = meta_file + ".tmp"
+    with open(tmp_file, "wb") as f:
+        fast_json.dump(meta, f, indent=True)
+    os.replace(tmp_file, meta_file)
+
+
+def add_blockchain_style_linking(
+    ledger_file=os.path.join("data", "vote_ledger.jsonl"),
+    chain_file=CHAIN_FILE,
+    meta_file=CHAIN_META_FILE
+):
     """
     Add blockchain-style hash linking to vote ledger
     Each vote includes hash of previous vote (immutable chain)
+    Blocks are appended to chain_file as JSON lines; votes linked by an
+    earlier run are not re-hashed or rewritten.
     """
     try:
-        with open(ledger_file, "r") as f:
-            ledger = json.load(f)
+        meta = load_chain_meta(meta_file)
+        if meta is not None and not os.path.exists(chain_file):
+            meta = None
         
-        votes = ledger.get("votes", [])
-        
-        if not votes:
-            print("⚠️  No votes to link")
-            return
+        linked = meta["chain_length"] if meta else 0
+        previous_hash = meta["latest_block_hash"].encode() if meta else GENESIS_HASH
         
-        # Link votes with previous hash
-        previous_hash = "0" * 64  # Genesis block hash
+        # Leaf digests packed back to back: 32 bytes per vote, not the vote fields
+        leaves = bytearray()
         
-        for idx, vote in enumerate(votes):
-            # Add previous hash link
-            vote["previous_hash"] = previous_hash
+        with open(chain_file, "r+b" if meta else "wb") as chain:
+            # Drop any blocks a crashed run wrote after the last saved metadata
+            if meta:
+                chain.seek(meta["chain_size"])
+                chain.truncate()
             
-            # Calculate current block hash
-            block_data = f"{vote['voter_id']}{vote['encrypted_vote']}{vote['timestamp']}{previous_hash}"
-            current_hash = hashlib.sha256(block_data.encode()).hexdigest()
-            vote["block_hash"] = current_hash
-            vote["block_number"] = idx + 1
+            for idx, vote in enumerate(iter_ledger_votes(ledger_file)):
+                vote_fields = _vote_fields(vote)
+                if idx < linked:
+                    # Already-linked block: only its leaf is needed
+                    leaves += hashlib.sha256(b"".join(vote_fields)).digest()
+                    continue
+                
+                # Calculate current block hash
+                current_hash, leaf = hash_block_and_leaf(*vote_fields, previous_hash)
+                leaves += leaf
+                block = {
+                    "block_number": idx + 1,
+                    "voter_id": vote['voter_id'],
+                    "previous_hash": previous_hash.decode(),
+                    "block_hash": current_hash.decode()
+                }
+                chain.write(fast_json.dumps(block) + b"\n")
+                
+                # Update for next iteration
+                previous_hash = current_hash
             
-            # Update for next iteration
-            previous_hash = current_hash
+            chain_size = chain.tell()
+        
+        vote_count = len(leaves) // LEAF_SIZE
+        if not vote_count:
+            print("⚠️  No votes to link")
+            return
         
-        # Save updated ledger
-        ledger["blockchain_enabled"] = True
-        ledger["chain_length"] = len(votes)
-        ledger["latest_block_hash"] = previous_hash
+        if vote_count < linked:
+            print("⚠️  Ledger is shorter than the existing chain, rebuilding it")
+            os.remove(meta_file)
+            return add_blockchain_style_linking(ledger_file, chain_file, meta_file)
         
-        with open(ledger_file, "w") as f:
-            json.dump(ledger, f, indent=4)
+        meta = {
+            "blockchain_enabled": True,
+            "chain_length": vote_count,
+            "latest_block_hash": previous_hash.decode(),
+            "merkle_root": merkle_root_from_leaves(leaves),
+            "chain_size": chain_size,
+            "last_linked": datetime.now().isoformat()
+        }
+        save_chain_meta(meta, meta_file)
         
-        print(f"✅ Blockchain-style linking added to {len(votes)} votes")
-        print(f"   Chain length: {len(votes)}")
-        print(f"   Latest block hash: {previous_hash[:32]}...")
+        print(f"✅ Blockchain-style linking added to {vote_count - linked} votes")
+        print(f"   Chain length: {vote_count}")
+        print(f"   Latest block hash: {meta['latest_block_hash'][:32]}...")
+        print(f"   Merkle root: {meta['merkle_root'][:32]}...")
         
-        return ledger
+        return meta
     
     except Exception as e:
         print(f"❌ Error adding blockchain linking: {e}")
         return None
 
 
-def verify_blockchain_integrity(ledger_file=os.path.join("data", "vote_ledger.json")):
+def verify_blockchain_integrity(
+    ledger_file=os.path.join("data", "vote_ledger.jsonl"),
+    chain_file=CHAIN_FILE,
+    meta_file=CHAIN_META_FILE
+):
     """
     Verify integrity of blockchain-linked ledger
+    Every linked vote in the ledger is re-hashed and checked against its block.
     """
     try:
-        with open(ledger_file, "r") as f:
-            ledger = json.load(f)
+        meta = load_chain_meta(meta_file)
         
-        if not ledger.get("blockchain_enabled"):
+        if not meta or not meta.get("blockchain_enabled"):
             print("⚠️  Ledger is not blockchain-linked")
             return False
         
-        votes = ledger.get("votes", [])
-        previous_hash = "0" * 64
+        votes = iter_ledger_votes(ledger_file)
+        previous_hash = GENESIS_HASH
+        leaves = bytearray()
         
-        print(f"🔍 Verifying blockchain integrity ({len(votes)} blocks)...")
+        print(f"🔍 Verifying blockchain integrity ({meta['chain_length']} blocks)...")
         
-        for idx, vote in enumerate(votes):
-            # Check previous hash matches
-            if vote.get("previous_hash") != previous_hash:
-                print(f"❌ Block {idx + 1}: Previous hash mismatch!")
-                return False
-            
-            # Recalculate block hash
-            block_data = f"{vote['voter_id']}{vote['encrypted_vote']}{vote['timestamp']}{previous_hash}"
-            calculated_hash = hashlib.sha256(block_data.encode()).hexdigest()
-            
-            if vote.get("block_hash") != calculated_hash:
-                print(f"❌ Block {idx + 1}: Block hash mismatch! Tampering detected!")
-                return False
-            
-            previous_hash = calculated_hash
+        with open(chain_file, "rb") as chain:
+            for idx, (vote, line) in enumerate(zip(votes, chain)):
+                block = fast_json.loads(line)
+                
+                # Check previous hash matches
+                if block.get("previous_hash", "").encode() != previous_hash:
+                    print(f"❌ Block {idx + 1}: Previous hash mismatch!")
+                    return False
+                
+                # Recalculate block hash
+                calculated_hash, leaf = hash_block_and_leaf(*_vote_fields(vote), previous_hash)
+                
+                if block.get("block_hash", "").encode() != calculated_hash:
+                    print(f"❌ Block {idx + 1}: Block hash mismatch! Tampering detected!")
+                    return False
+                
+                previous_hash = calculated_hash
+                leaves += leaf
+        
+        vote_count = len(leaves) // LEAF_SIZE
+        if vote_count != meta["chain_length"] or previous_hash.decode() != meta["latest_block_hash"]:
+            print("❌ Chain length or latest block hash mismatch! Tampering detected!")
+            return False
         
-        print(f"✅ Blockchain integrity verified: All {len(votes)} blocks are valid")
+        if merkle_root_from_leaves(leaves) != meta.get("merkle_root"):
+            print("❌ Merkle root mismatch! Tampering detected!")
+            return False
+        
+        print(f"✅ Blockchain integrity verified: All {vote_count} blocks are valid")
         return True
     
     except Exception as e:
@@ -273,7 +449,7 @@ def generate_complete_report():
     
     # 4. Add blockchain linking
     print("\n4. Adding blockchain-style hash linking...")
-    ledger = add_blockchain_style_linking()
+    chain_meta = add_blockchain_style_linking()
     
     # 5. Verify blockchain integrity
     print("\n5. Verifying blockchain integrity...")
@@ -296,52 +472,57 @@ def create_summary_report(report_files):
     """
     Create a text summary of all reports
     """
-    # FIX: Added encoding='utf-8' to support the checkmark character (✓)
-    with open(os.path.join("outputs", "reports", "report_summary.txt"), "w", encoding='utf-8') as f:
-        f.write("="*60 + "\n")
-        f.write("ELECTION RESULTS - COMPLETE REPORT\n")
-        f.write("="*60 + "\n\n")
+    # Build the report in memory and write it with a single call
+    buf = io.StringIO()
+    
+    buf.write("="*60 + "\n")
+    buf.write("ELECTION RESULTS - COMPLETE REPORT\n")
+    buf.write("="*60 + "\n\n")
+    
+    buf.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+    
+    # Results summary
+    try:
+        with open(os.path.join("data", "election_results.json"), "rb") as results_f:
+            results = fast_json.load(results_f)
         
-        f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        buf.write("ELECTION RESULTS\n")
+        buf.write("-" * 60 + "\n")
         
-        # Results summary
-        try:
-            with open(os.path.join("data", "election_results.json"), "r") as results_f:
-                results = json.load(results_f)
-            
-            f.write("ELECTION RESULTS\n")
-            f.write("-" * 60 + "\n")
-            
-            # FIX START: Using corrected keys for report summary
-            total_votes = results.get('total_votes', 0)
-            f.write(f"Total Votes: {total_votes}\n")
-            f.write(f"Winner: Candidate {results.get('winner', 'N/A')}\n\n")
-            
-            f.write("Vote Distribution:\n")
-            for candidate, count in results.get('vote_counts', {}).items():
-                percentage = (count / total_votes * 100) if total_votes > 0 else 0
-                f.write(f"  Candidate {candidate}: {count} votes ({percentage:.1f}%)\n")
-            # FIX END
-            
-        except:
-            f.write("Results not available\n")
-        
-        f.write("\n" + "="*60 + "\n")
-        f.write("GENERATED FILES\n")
-        f.write("="*60 + "\n\n")
-        
-        for file in report_files:
-            f.write(f"  ✓ {file}\n")
-        
-        f.write("\n" + "="*60 + "\n")
-        f.write("SECURITY FEATURES\n")
-        f.write("="*60 + "\n\n")
-        f.write("  ✓ RSA-2048 Encryption\n")
-        f.write("  ✓ Time-Lock Mechanism\n")
-        f.write("  ✓ SHA-256 Integrity Hashing\n")
-        f.write("  ✓ Blockchain-Style Linking\n")
-        f.write("  ✓ One-Time Voting Enforcement\n")
-        f.write("  ✓ Tamper-Evident Ledger\n")
+        # FIX START: Using corrected keys for report summary
+        total_votes = results.get('total_votes', 0)
+        buf.write(f"Total Votes: {total_votes}\n")
+        buf.write(f"Winner: Candidate {results.get('winner', 'N/A')}\n\n")
+        
+        buf.write("Vote Distribution:\n")
+        for candidate, count in results.get('vote_counts', {}).items():
+            percentage = (count / total_votes * 100) if total_votes > 0 else 0
+            buf.write(f"  Candidate {candidate}: {count} votes ({percentage:.1f}%)\n")
+        # FIX END
+        
+    except:
+        buf.write("Results not available\n")
+    
+    buf.write("\n" + "="*60 + "\n")
+    buf.write("GENERATED FILES\n")
+    buf.write("="*60 + "\n\n")
+    
+    for file in report_files:
+        buf.write(f"  ✓ {file}\n")
+    
+    buf.write("\n" + "="*60 + "\n")
+    buf.write("SECURITY FEATURES\n")
+    buf.write("="*60 + "\n\n")
+    buf.write("  ✓ RSA-2048 Encryption\n")
+    buf.write("  ✓ Time-Lock Mechanism\n")
+    buf.write("  ✓ SHA-256 Integrity Hashing\n")
+    buf.write("  ✓ Blockchain-Style Linking\n")
+    buf.write("  ✓ One-Time Voting Enforcement\n")
+    buf.write("  ✓ Tamper-Evident Ledger\n")
+    
+    # FIX: Added encoding='utf-8' to support the checkmark character (✓)
+    with open(os.path.join("outputs", "reports", "report_summary.txt"), "w", encoding='utf-8') as f:
+        f.write(buf.getvalue())
     
     print("✅ Summary report created: report_summary.txt")
 
@@ -9,6 +9,17 @@ import sys
 import time
 import os
 import signal
+import importlib.util
+
+# Threads per gunicorn worker (gthread worker class)
+GUNICORN_THREADS = 4
+# Storage threads mostly wait: on the ledger writer's fsync or a tally's
+# time lock. More of them means bigger group commits and free threads for stores.
+STORAGE_GUNICORN_THREADS = 32
+# Every open admin tab holds one frontend thread (and one storage thread) for
+# its tally status stream, up to the streams' 5-minute limit. The frontend gets
+# enough threads that a handful of tabs cannot starve login/vote/submit.
+FRONTEND_GUNICORN_THREADS = 32
 
 def print_banner():
     print("=" * 70)
@@ -35,17 +46,50 @@ def check_dependencies():
         subprocess.check_call([sys.executable, "-m", "pip", "install"] + missing)
         print("✅ All packages installed!\n")
 
+def use_gunicorn():
+    """gunicorn is used when installed; it does not run on Windows"""
+    return sys.platform != 'win32' and importlib.util.find_spec('gunicorn') is not None
+
+def service_env(workers):
+    """Environment for a service: its workers split the cores for their decrypt pools"""
+    cores = os.cpu_count() or 1
+    return dict(os.environ, DECRYPT_POOL_WORKERS=str(max(1, cores // workers)))
+
+def service_command(script, port, workers, threads=GUNICORN_THREADS):
+    """Command line for a service: gunicorn if available, else the Flask dev server"""
+    if not use_gunicorn():
+        return [sys.executable, script]
+    
+    # --preload imports the app once in the master, so keys are generated
+    # before the workers fork instead of racing each other
+    module = os.path.splitext(script)[0]
+    return [
+        sys.executable, "-m", "gunicorn",
+        "--preload",
+        "-w", str(workers),
+        "-k", "gthread",
+        "--threads", str(threads),
+        "-b", f"127.0.0.1:{port}",
+        f"{module}:app"
+    ]
+
 def start_all_services():
     """Start all three services in separate subprocesses"""
+    # Storage and the frontend keep in-memory state (tally flag, vote
+    # receipts), so only the encryption service gets multiple workers.
+    # Storage still uses every core for a tally through its decrypt pool.
     services = [
-        ("encryption_service.py", "Encryption Service", 5001),
-        ("storage_service.py", "Storage Service", 5002),
-        ("app.py", "Main Application", 5000)
+        ("encryption_service.py", "Encryption Service", 5001, os.cpu_count() or 1, GUNICORN_THREADS),
+        ("storage_service.py", "Storage Service", 5002, 1, STORAGE_GUNICORN_THREADS),
+        ("app.py", "Main Application", 5000, 1, FRONTEND_GUNICORN_THREADS)
     ]
     
+    server = "gunicorn" if use_gunicorn() else "Flask development server"
+    print(f"🧩 Using {server}\n")
+    
     processes = []
     
-    for script, name, port in services:
+    for script, name, port, workers, threads in services:
         if not os.path.exists(script):
             print(f"❌ ERROR: {script} not found in current directory!")
             return None
@@ -53,16 +97,21 @@ def start_all_services():
         try:
             print(f"🚀 Starting {name} on port {port}...")
             
-            # Start process without capturing output (let it print to console)
+            # Start process without capturing output (let it print to console).
+            # On Unix each service gets its own process group so shutdown can
+            # signal the whole tree (gunicorn workers, decrypt pool processes)
             process = subprocess.Popen(
-                [sys.executable, script],
-                creationflags=subprocess.CREATE_NEW_CONSOLE if sys.platform == 'win32' else 0
+                service_command(script, port, workers, threads),
+                env=service_env(workers),
+                creationflags=subprocess.CREATE_NEW_CONSOLE if sys.platform == 'win32' else 0,
+                start_new_session=sys.platform != 'win32'
             )
             
             processes.append({
                 'process': process,
                 'name': name,
-                'port': port
+                'port': port,
+                'reported': False
             })
             
             time.sleep(2)  # Wait 2 seconds between starting each service
@@ -79,11 +128,33 @@ def cleanup_processes(processes):
         print("\n🛑 Stopping all services...")
         for service in processes:
             try:
-                service['process'].terminate()
+                if sys.platform == 'win32':
+                    service['process'].terminate()
+                else:
+                    os.killpg(service['process'].pid, signal.SIGTERM)
                 print(f"   ✓ Stopped {service['name']}")
             except:
                 pass
 
+def report_stopped_services(processes):
+    """Warn (once per service) about services that have exited"""
+    for service in processes:
+        if not service['reported'] and service['process'].poll() is not None:
+            service['reported'] = True
+            print(f"⚠️  {service['name']} has stopped unexpectedly!")
+
+def wait_for_services(processes):
+    """Block until Ctrl+C, reporting services that stop along the way"""
+    if hasattr(signal, 'SIGCHLD'):
+        # Sleep until a child actually exits instead of polling every second
+        signal.signal(signal.SIGCHLD, lambda signum, frame: report_stopped_services(processes))
+        while True:
+            signal.pause()
+    else:
+        while True:
+            report_stopped_services(processes)
+            time.sleep(1)
+
 def main():
     print_banner()
     
@@ -124,16 +195,13 @@ def main():
     
     try:
         # Keep the main thread alive and monitor processes
-        while True:
-            # Check if any process has died
-            for service in processes:
-                if service['process'].poll() is not None:
-                    print(f"⚠️  {service['name']} has stopped unexpectedly!")
-            time.sleep(1)
+        wait_for_services(processes)
             
     except KeyboardInterrupt:
         print("\n\n🛑 Shutting down E-Voting System...")
         print("=" * 70)
+        if hasattr(signal, 'SIGCHLD'):
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
         cleanup_processes(processes)
         print("✅ All services stopped")
         print("=" * 70)
@@ -4,8 +4,8 @@
 # MODIFIED: Supports continuous voting during time-lock
 # ---------------------------------------------------------------
 
-from flask import Flask, request, jsonify
-import json
+from flask import Flask, request, jsonify, Response
+import fast_json
 import os
 os.makedirs('data', exist_ok=True)
 import hashlib
@@ -13,35 +13,103 @@ from datetime import datetime
 import requests
 import time 
 import threading
+import uuid
+import queue
+from contextlib import contextmanager
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 
 # Import necessary cryptography components to decrypt locally
 from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.primitives import serialization, hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.backends import default_backend
 import base64
+import binascii
+
+# Optional: accept msgpack request bodies from the encryption service
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Optional: cross-process ledger lock (not available on Windows)
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 app = Flask(__name__)
+# jsonify() and request.get_json() go through orjson when it is installed
+app.json = fast_json.FastJSONProvider(app)
 
-LEDGER_FILE = os.path.join("data", "vote_ledger.json")
+LEDGER_FILE = os.path.join("data", "vote_ledger.jsonl")
+LEDGER_META_FILE = os.path.join("data", "vote_ledger_meta.json")
+LEGACY_LEDGER_FILE = os.path.join("data", "vote_ledger.json")
+LEDGER_LOCK_FILE = os.path.join("data", "vote_ledger.lock")
 RESULTS_FILE = os.path.join("data", "election_results.json")
 PRIVATE_KEY_FILE = os.path.join("keys", "private_key.pem") 
+SESSION_KEY_FILE = os.path.join("keys", "session.bin")
+
+# Must match the encryption service's hybrid ciphertext format
+HYBRID_PREFIX = "aesgcm"
+GCM_NONCE_SIZE = 12
+
+# Same OAEP parameters as the encryption service; built once and shared
+OAEP_PADDING = padding.OAEP(
+    mgf=padding.MGF1(algorithm=hashes.SHA256()),
+    algorithm=hashes.SHA256(),
+    label=None
+)
+
+# Status stream polling interval and keep-alive period (seconds)
+STATUS_STREAM_INTERVAL = 1
+STATUS_STREAM_KEEPALIVE = 15
+# Each stream ends after this long so it doesn't hold a server thread
+# forever; EventSource reconnects after its retry delay
+STATUS_STREAM_MAX_SECONDS = 300
 
 # Global flag to track if tallying is in progress
 tallying_in_progress = False
 tallying_lock = threading.Lock()
 
+# Serializes ledger appends within this process (see ledger_write_lock);
+# voter ids and metadata are kept in memory
+ledger_lock = threading.Lock()
+_VOTER_IDS = set()
+_LEDGER_META = None
+# Every parsed ledger entry, kept resident; the JSONL file is its durable log
+_LEDGER_VOTES = []
+
+# How much of the ledger files this process has already seen, so writes from
+# other processes (e.g. gunicorn workers) are picked up under the file lock
+_LEDGER_OFFSET = 0
+_LEDGER_META_VERSION = None
+
 
 # ============ Module 0: Local Decryption Logic ============
 
+# Parsed private key, reused until the PEM file changes on disk
+_PRIVATE_KEY = None
+_PRIVATE_KEY_MTIME = None
+
+
 def load_private_key_local():
-    """Load private key from file for local decryption"""
+    """Load private key from file for local decryption (cached)"""
+    global _PRIVATE_KEY, _PRIVATE_KEY_MTIME
     try:
+        mtime = os.stat(PRIVATE_KEY_FILE).st_mtime_ns
+        if _PRIVATE_KEY is not None and mtime == _PRIVATE_KEY_MTIME:
+            return _PRIVATE_KEY
+        
         with open(PRIVATE_KEY_FILE, "rb") as f:
             private_key = serialization.load_pem_private_key(
                 f.read(),
                 password=None,
                 backend=default_backend()
             )
+        _PRIVATE_KEY, _PRIVATE_KEY_MTIME = private_key, mtime
         return private_key
     except FileNotFoundError:
         print(f"❌ CRITICAL ERROR: Private key not found at {PRIVATE_KEY_FILE}. Run encryption_service.py first to generate keys.")
@@ -50,10 +118,42 @@ def load_private_key_local():
         print(f"❌ CRITICAL ERROR: Failed to load private key: {e}")
         return None
 
+# Unwrapped election keys, keyed by kid, so session.bin is RSA-decrypted once
+_SESSION_CIPHERS = {}
+
+
+def load_session_cipher_local(kid, private_key):
+    """Unwrap the election AES key from SESSION_KEY_FILE and return its AESGCM cipher"""
+    cipher = _SESSION_CIPHERS.get(kid)
+    if cipher is not None:
+        return cipher
+    
+    with open(SESSION_KEY_FILE, "rb") as f:
+        wrapped_key = f.read()
+    if hashlib.sha256(wrapped_key).hexdigest()[:16] != kid:
+        raise Exception(f"Unknown election key id {kid}")
+    
+    session_key = private_key.decrypt(
+        wrapped_key,
+        OAEP_PADDING
+    )
+    cipher = AESGCM(session_key)
+    _SESSION_CIPHERS[kid] = cipher
+    return cipher
+
+
 def decrypt_vote_data_local(encrypted_vote_b64, private_key):
-    """Decrypt an encrypted vote using RSA private key, locally"""
+    """Decrypt an encrypted vote (hybrid AES-GCM, or legacy RSA-OAEP), locally"""
     if not private_key:
         raise Exception("Private key not loaded for local decryption.")
+    
+    if encrypted_vote_b64.startswith(HYBRID_PREFIX + ":"):
+        _, kid, payload_b64 = encrypted_vote_b64.split(":", 2)
+        cipher = load_session_cipher_local(kid, private_key)
+        # a2b_base64 skips b64decode's Python-level argument handling
+        payload = binascii.a2b_base64(payload_b64)
+        nonce, ciphertext = payload[:GCM_NONCE_SIZE], payload[GCM_NONCE_SIZE:]
+        return cipher.decrypt(nonce, ciphertext, None).decode()
         
     # Convert base64 back to bytes
     encrypted_vote = base64.b64decode(encrypted_vote_b64)
@@ -61,64 +161,344 @@ def decrypt_vote_data_local(encrypted_vote_b64, private_key):
     # Decrypt the vote
     decrypted_vote = private_key.decrypt(
         encrypted_vote,
-        padding.OAEP(
-            mgf=padding.MGF1(algorithm=hashes.SHA256()),
-            algorithm=hashes.SHA256(),
-            label=None
-        )
+        OAEP_PADDING
     )
     
     return decrypted_vote.decode()
 
 
+# One progress line per this many votes during a tally (stdout is shared
+# by every request thread, so per-vote prints serialize the loop)
+TALLY_PROGRESS_INTERVAL = 100
+
+# Legacy RSA votes in a batch below this are decrypted in-process; forking
+# workers costs more. Hybrid AES-GCM votes (~1 us each) never go to the pool.
+TALLY_PARALLEL_THRESHOLD = 256
+
+# Private key of a decryption worker process, set by _init_decrypt_worker
+_WORKER_PRIVATE_KEY = None
+
+
+def _try_decrypt(encrypted_vote_b64, private_key):
+    """Decrypt one vote, returning (True, plaintext) or (False, error message)"""
+    try:
+        return True, decrypt_vote_data_local(encrypted_vote_b64, private_key)
+    except Exception as e:
+        return False, str(e)
+
+
+def _init_decrypt_worker(pem_bytes):
+    """Parse the private key once per worker process"""
+    global _WORKER_PRIVATE_KEY
+    _WORKER_PRIVATE_KEY = serialization.load_pem_private_key(
+        pem_bytes,
+        password=None,
+        backend=default_backend()
+    )
+
+
+def _decrypt_worker(encrypted_vote_b64):
+    return _try_decrypt(encrypted_vote_b64, _WORKER_PRIVATE_KEY)
+
+
+def decrypt_ciphertexts(ciphertexts, private_key):
+    """
+    Decrypt a list of votes, preserving order
+    Many legacy RSA votes are spread over one worker process per core, since
+    each is a modexp; hybrid votes are cheaper to decrypt here than to ship
+    to a worker. Returns (ok, plaintext or error) pairs.
+    """
+    workers = os.cpu_count() or 1
+    legacy = [i for i, ct in enumerate(ciphertexts) if not ct.startswith(HYBRID_PREFIX + ":")]
+    if workers == 1 or len(legacy) < TALLY_PARALLEL_THRESHOLD:
+        return [_try_decrypt(ct, private_key) for ct in ciphertexts]
+    
+    with open(PRIVATE_KEY_FILE, "rb") as f:
+        pem_bytes = f.read()
+    
+    outcomes = [None] * len(ciphertexts)
+    chunksize = max(1, len(legacy) // (4 * workers))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_decrypt_worker, initargs=(pem_bytes,)) as pool:
+        pending = pool.map(_decrypt_worker, [ciphertexts[i] for i in legacy], chunksize=chunksize)
+        
+        # Hybrid votes are decrypted here while the workers run
+        legacy_set = set(legacy)
+        for i, ct in enumerate(ciphertexts):
+            if i not in legacy_set:
+                outcomes[i] = _try_decrypt(ct, private_key)
+        
+        for i, outcome in zip(legacy, pending):
+            outcomes[i] = outcome
+    return outcomes
+
+
 # ============ Module 1: Ledger Initialization ============
+def new_ledger_meta():
+    """Metadata for an empty ledger"""
+    return {
+        "created_at": datetime.now().isoformat(),
+        "total_votes": 0,
+        "last_tallied_index": -1  # NEW: Track which votes have been tallied
+    }
+
+
 def init_ledger():
-    """Initialize empty ledger if it doesn't exist"""
+    """Initialize empty ledger if it doesn't exist and load voter index"""
+    global _LEDGER_META
     if not os.path.exists(LEDGER_FILE):
-        ledger = {
-            "votes": [],
-            "metadata": {
-                "created_at": datetime.now().isoformat(),
-                "total_votes": 0,
-                "last_tallied_index": -1  # NEW: Track which votes have been tallied
-            }
-        }
-        save_ledger(ledger)
-        print("✅ Ledger initialized")
+        if os.path.exists(LEGACY_LEDGER_FILE):
+            migrate_legacy_ledger()
+            print("✅ Ledger migrated to JSONL")
+        else:
+            open(LEDGER_FILE, "a").close()
+            print("✅ Ledger initialized")
     else:
-        # Ensure last_tallied_index exists in existing ledgers
-        ledger = load_ledger()
-        if "last_tallied_index" not in ledger.get("metadata", {}):
-            ledger["metadata"]["last_tallied_index"] = -1
-            save_ledger(ledger)
         print("✅ Ledger already exists")
+    
+    # One scan at startup; duplicate checks then hit the in-memory set
+    with ledger_write_lock(sync=False):
+        total_votes = sync_ledger_tail()
+        
+        meta = load_ledger_meta()
+        meta.setdefault("created_at", datetime.now().isoformat())
+        meta.setdefault("last_tallied_index", -1)
+        meta["total_votes"] = total_votes
+        _LEDGER_META = meta
+        save_ledger_meta()
+
+
+def migrate_legacy_ledger():
+    """Convert the old single-document vote_ledger.json into JSONL + meta"""
+    with open(LEGACY_LEDGER_FILE, "rb") as f:
+        legacy = fast_json.load(f)
+    
+    tmp_file = LEDGER_FILE + ".tmp"
+    with open(tmp_file, "wb") as f:
+        for vote in legacy.get("votes", []):
+            f.write(fast_json.dumps(vote) + b"\n")
+    os.replace(tmp_file, LEDGER_FILE)
+    
+    meta = new_ledger_meta()
+    meta.update(legacy.get("metadata", {}))
+    write_json_atomic(LEDGER_META_FILE, meta)
+
+
+def load_ledger_meta():
+    """Load ledger metadata from JSON file"""
+    try:
+        with open(LEDGER_META_FILE, "rb") as f:
+            return fast_json.load(f)
+    except (OSError, ValueError):
+        return new_ledger_meta()
+
+
+def write_json_atomic(path, data):
+    """Write compact JSON via a temp file so readers never see a partial file"""
+    # Temp name unique per process and thread, next to the target so
+    # os.replace stays a same-filesystem rename (and keeps umask permissions,
+    # unlike mkstemp's 0600)
+    tmp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_file, "wb") as f:
+            fast_json.dump(data, f)
+        os.replace(tmp_file, path)
+    except BaseException:
+        # Don't leave the temp file behind (e.g. SIGTERM mid-write)
+        try:
+            os.unlink(tmp_file)
+        except OSError:
+            pass
+        raise
+
+
+def save_ledger_meta():
+    """Save in-memory ledger metadata"""
+    global _LEDGER_META_VERSION
+    write_json_atomic(LEDGER_META_FILE, _LEDGER_META)
+    _LEDGER_META_VERSION = _meta_file_version()
+
+
+def sync_ledger_tail():
+    """
+    Catch up on ledger lines appended since this process last looked
+    Adds them to _LEDGER_VOTES and _VOTER_IDS, truncates a torn final line left by
+    a crash, and returns how many entries were read. Call with the lock held.
+    """
+    global _LEDGER_OFFSET
+    added = 0
+    try:
+        with open(LEDGER_FILE, "r+b") as f:
+            f.seek(_LEDGER_OFFSET)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    f.truncate(_LEDGER_OFFSET)
+                    break
+                vote = fast_json.loads(line)
+                _LEDGER_VOTES.append(vote)
+                _VOTER_IDS.add(vote["voter_id"])
+                _LEDGER_OFFSET += len(line)
+                added += 1
+    except FileNotFoundError:
+        pass
+    return added
+
 
+def _meta_file_version():
+    """Identify the current meta file; every save replaces it with a new inode"""
+    st = os.stat(LEDGER_META_FILE)
+    return (st.st_ino, st.st_mtime_ns)
 
-def load_ledger():
-    """Load ledger from JSON file"""
+
+def sync_ledger_meta():
+    """Adopt metadata written by another process since our last save"""
+    global _LEDGER_META, _LEDGER_META_VERSION
     try:
-        with open(LEDGER_FILE, "r") as f:
-            return json.load(f)
-    except:
-        return {"votes": [], "metadata": {"total_votes": 0, "last_tallied_index": -1}}
+        version = _meta_file_version()
+    except FileNotFoundError:
+        return
+    if version != _LEDGER_META_VERSION:
+        _LEDGER_META = load_ledger_meta()
+        _LEDGER_META_VERSION = version
+
+
+@contextmanager
+def ledger_write_lock(sync=True):
+    """
+    Serialize ledger writes across threads and, where fcntl exists, processes
+    The lock file is opened per call: a descriptor inherited across fork
+    would share one flock between workers.
+    """
+    with ledger_lock:
+        if fcntl is None:
+            yield
+            return
+        
+        with open(LEDGER_LOCK_FILE, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if sync:
+                    sync_ledger_tail()
+                    sync_ledger_meta()
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def ledger_counts():
+    """(total votes, last tallied index) from the metadata counters, O(1)"""
+    with ledger_write_lock():
+        return _LEDGER_META["total_votes"], _LEDGER_META.get("last_tallied_index", -1)
+
+
+# Read size for streaming the ledger file out over /ledger
+LEDGER_STREAM_CHUNK = 1 << 16
 
 
-def save_ledger(ledger):
-    """Save ledger to JSON file"""
-    with open(LEDGER_FILE, "w") as f:
-        json.dump(ledger, f, indent=4)
+def iter_ledger_json(ledger_size, metadata):
+    """
+    Yield {"votes": [...], "metadata": {...}} as JSON built from the first
+    ledger_size bytes of the JSONL file, without parsing a single entry
+    Lines are compact JSON objects, so each newline becomes a comma.
+    """
+    yield b'{"votes":['
+    if ledger_size:
+        with open(LEDGER_FILE, "rb") as f:
+            remaining = ledger_size
+            while remaining > 0:
+                chunk = f.read(min(LEDGER_STREAM_CHUNK, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                chunk = chunk.replace(b"\n", b",")
+                # ledger_size always ends on a newline: drop the final comma
+                yield chunk[:-1] if remaining == 0 else chunk
+    yield b'],"metadata":' + fast_json.dumps(metadata) + b'}'
 
 
 # ============ Module 2: Vote Storage ============
+# Concurrent stores are handed to one writer thread, which appends whatever
+# has queued up in a single write and saves the metadata once per batch
+STORE_BATCH_SIZE = 64
+_STORE_QUEUE = queue.Queue()
+_STORE_WRITER_PID = None
+_STORE_WRITER_LOCK = threading.Lock()
+
+
+def ensure_store_writer():
+    """Start the ledger writer thread (again after a fork: threads don't survive it)"""
+    global _STORE_WRITER_PID
+    if _STORE_WRITER_PID == os.getpid():
+        return
+    with _STORE_WRITER_LOCK:
+        if _STORE_WRITER_PID != os.getpid():
+            threading.Thread(target=store_writer_loop, daemon=True).start()
+            _STORE_WRITER_PID = os.getpid()
+
+
+def store_writer_loop():
+    """Drain queued stores in batches; never waits to fill a batch"""
+    while True:
+        batch = [_STORE_QUEUE.get()]
+        while len(batch) < STORE_BATCH_SIZE:
+            try:
+                batch.append(_STORE_QUEUE.get_nowait())
+            except queue.Empty:
+                break
+        
+        try:
+            append_vote_batch(batch)
+        except Exception as e:
+            for pending in batch:
+                if pending["result"] is None:
+                    pending["error"] = e
+        
+        for pending in batch:
+            pending["done"].set()
+
+
+def append_vote_batch(batch):
+    """Append a batch of pending stores to the ledger, rejecting duplicates"""
+    global _LEDGER_OFFSET
+    with ledger_write_lock():
+        accepted = []
+        for pending in batch:
+            vote_entry = pending["entry"]
+            # Check for duplicate voter (also within this batch)
+            if vote_entry["voter_id"] in _VOTER_IDS:
+                pending["result"] = (False, "Voter has already cast a vote")
+                continue
+            _VOTER_IDS.add(vote_entry["voter_id"])
+            accepted.append(pending)
+        
+        if not accepted:
+            return
+        
+        # Append the new lines; existing entries are never rewritten
+        data = b"".join(fast_json.dumps(pending["entry"]) + b"\n" for pending in accepted)
+        try:
+            with open(LEDGER_FILE, "ab") as f:
+                f.write(data)
+                # Votes are acknowledged only once on disk; one fsync per batch
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception:
+            for pending in accepted:
+                _VOTER_IDS.discard(pending["entry"]["voter_id"])
+            raise
+        _LEDGER_OFFSET += len(data)
+        
+        _LEDGER_VOTES.extend(pending["entry"] for pending in accepted)
+        
+        _LEDGER_META["total_votes"] += len(accepted)
+        _LEDGER_META["last_updated"] = datetime.now().isoformat()
+        save_ledger_meta()
+        
+        for pending in accepted:
+            pending["result"] = (True, pending["entry"]["vote_hash"])
+
+
 def store_encrypted_vote(voter_id, encrypted_vote, timestamp):
-    """Store encrypted vote in ledger with hash"""
-    ledger = load_ledger()
-    
-    # Check for duplicate voter
-    for vote in ledger["votes"]:
-        if vote["voter_id"] == voter_id:
-            return False, "Voter has already cast a vote"
-    
+    """Append encrypted vote to ledger with hash; returns once it is written"""
     # Create vote entry with tallied status
     vote_entry = {
         "voter_id": voter_id,
@@ -128,14 +508,14 @@ def store_encrypted_vote(voter_id, encrypted_vote, timestamp):
         "tallied": False  # NEW: Track if this vote has been tallied
     }
     
-    # Append to ledger
-    ledger["votes"].append(vote_entry)
-    ledger["metadata"]["total_votes"] = len(ledger["votes"])
-    ledger["metadata"]["last_updated"] = datetime.now().isoformat()
+    pending = {"entry": vote_entry, "done": threading.Event(), "result": None, "error": None}
+    ensure_store_writer()
+    _STORE_QUEUE.put(pending)
+    pending["done"].wait()
     
-    save_ledger(ledger)
-    
-    return True, vote_entry["vote_hash"]
+    if pending["error"] is not None:
+        raise pending["error"]
+    return pending["result"]
 
 
 # ============ Module 3: Decryption & Tallying (MODIFIED) ============
@@ -148,19 +528,23 @@ def decrypt_all_votes(time_lock_seconds=10, tally_all=False):
         time_lock_seconds: Time lock duration
         tally_all: If True, retally all votes. If False, only tally new votes
     """
-    ledger = load_ledger()
+    # The time lock runs from the start of the tally: preparation below
+    # (ledger, key, election key unwrap) overlaps it instead of following it
+    unlock_at = time.monotonic() + time_lock_seconds
+    
+    # Determine which votes to process (slicing copies only those entries)
+    with ledger_write_lock():
+        start_index = 0 if tally_all else _LEDGER_META.get('last_tallied_index', -1) + 1
+        votes_to_process = _LEDGER_VOTES[start_index:]
     
-    # Determine which votes to process
     if tally_all:
-        votes_to_process = ledger['votes']
-        start_index = 0
         print(f"🔓 FULL TALLY: Processing all {len(votes_to_process)} votes...")
     else:
-        last_tallied = ledger['metadata'].get('last_tallied_index', -1)
-        votes_to_process = ledger['votes'][last_tallied + 1:]
-        start_index = last_tallied + 1
         print(f"🔓 INCREMENTAL TALLY: Processing {len(votes_to_process)} new votes (from index {start_index})...")
     
+    # Votes appended after this snapshot are left for the next tally
+    total_in_ledger = start_index + len(votes_to_process)
+    
     if len(votes_to_process) == 0:
         print("ℹ️  No new votes to tally")
         return []
@@ -174,22 +558,33 @@ def decrypt_all_votes(time_lock_seconds=10, tally_all=False):
         print("❌ Cannot decrypt: Private key not loaded")
         return []
     
+    ciphertexts = [vote_entry.get("encrypted_vote", "") for vote_entry in votes_to_process]
+    
+    # Unwrap the election key(s) now; this decrypts key material, not votes
+    for kid in {ct.split(":", 2)[1] for ct in ciphertexts if ct.startswith(HYBRID_PREFIX + ":") and ct.count(":") >= 2}:
+        try:
+            load_session_cipher_local(kid, private_key)
+        except Exception:
+            pass  # Reported per vote during decryption
+    
     # Enforce Time Lock ONCE before processing
-    print(f"⏳ Time lock active for {time_lock_seconds} seconds...")
-    time.sleep(time_lock_seconds)
+    remaining = unlock_at - time.monotonic()
+    print(f"⏳ Time lock active for {max(remaining, 0):.1f} more seconds...")
+    if remaining > 0:
+        time.sleep(remaining)
     print("✅ Time lock completed. Beginning tally.")
     
+    # Decrypt Locally (in parallel for large batches)
+    outcomes = decrypt_ciphertexts(ciphertexts, private_key)
+    
     # Process each vote
-    for idx, vote_entry in enumerate(votes_to_process):
+    for idx, (vote_entry, (decrypted_ok, decrypted_vote_string)) in enumerate(zip(votes_to_process, outcomes)):
         vote_num = start_index + idx + 1
         voter_id = vote_entry.get("voter_id", "UNKNOWN")
         
         try:
-            # Decrypt Locally
-            decrypted_vote_string = decrypt_vote_data_local(
-                vote_entry["encrypted_vote"],
-                private_key
-            )
+            if not decrypted_ok:
+                raise Exception(decrypted_vote_string)
             
             # Parse the decrypted vote
             parts = decrypted_vote_string.split('|')
@@ -201,25 +596,27 @@ def decrypt_all_votes(time_lock_seconds=10, tally_all=False):
                     "candidate": candidate,
                     "timestamp": timestamp
                 })
-                print(f"✅ [{vote_num}/{len(ledger['votes'])}] Decrypted vote for Voter {voter_id} → Candidate {candidate}")
             else:
-                print(f"⚠️  [{vote_num}/{len(ledger['votes'])}] Invalid format after decryption (Voter: {voter_id})")
                 failed_votes.append({
                     "voter_id": voter_id,
                     "reason": "Invalid format after decryption"
                 })
 
         except Exception as e:
-            print(f"❌ [{vote_num}/{len(ledger['votes'])}] Decryption failed (Voter: {voter_id}): {str(e)}")
             failed_votes.append({
                 "voter_id": voter_id,
                 "reason": str(e)
             })
+        
+        # Progress every TALLY_PROGRESS_INTERVAL votes; failures are listed in the summary
+        if (idx + 1) % TALLY_PROGRESS_INTERVAL == 0 or idx + 1 == len(votes_to_process):
+            print(f"🔓 [{vote_num}/{total_in_ledger}] {len(decrypted_votes)} decrypted, {len(failed_votes)} failed")
     
     # Update last tallied index
     if decrypted_votes:
-        ledger['metadata']['last_tallied_index'] = len(ledger['votes']) - 1
-        save_ledger(ledger)
+        with ledger_write_lock():
+            _LEDGER_META['last_tallied_index'] = total_in_ledger - 1
+            save_ledger_meta()
     
     # Summary
     print(f"\n📊 Decryption Summary:")
@@ -242,31 +639,24 @@ def tally_votes(new_decrypted_votes, incremental=False):
     """
     if incremental and os.path.exists(RESULTS_FILE):
         # Load existing results and add new votes
-        with open(RESULTS_FILE, "r") as f:
-            existing_results = json.load(f)
+        with open(RESULTS_FILE, "rb") as f:
+            existing_results = fast_json.load(f)
         
-        vote_counts = existing_results.get("vote_counts", {})
+        vote_counts = Counter(existing_results.get("vote_counts", {}))
         
-        # Add new votes to existing counts
-        for vote in new_decrypted_votes:
-            candidate = vote["candidate"]
-            vote_counts[candidate] = vote_counts.get(candidate, 0) + 1
+        # Add new votes to existing counts (Counter counts in C)
+        vote_counts.update(vote["candidate"] for vote in new_decrypted_votes)
         
         total_votes = sum(vote_counts.values())
     else:
         # Full retally - start fresh
-        vote_counts = {}
-        for vote in new_decrypted_votes:
-            candidate = vote["candidate"]
-            vote_counts[candidate] = vote_counts.get(candidate, 0) + 1
+        vote_counts = Counter(vote["candidate"] for vote in new_decrypted_votes)
         
         total_votes = len(new_decrypted_votes)
     
-    # Calculate winner
-    if vote_counts:
-        winner = max(vote_counts, key=vote_counts.get)
-    else:
-        winner = None
+    # Calculate winner (ties go to the first candidate counted, as before)
+    winner = vote_counts.most_common(1)[0][0] if vote_counts else None
+    vote_counts = dict(vote_counts)
     
     results = {
         "vote_counts": vote_counts,
@@ -276,9 +666,8 @@ def tally_votes(new_decrypted_votes, incremental=False):
         "tally_type": "incremental" if incremental else "full"
     }
     
-    # Save results
-    with open(RESULTS_FILE, "w") as f:
-        json.dump(results, f, indent=4)
+    # Save results (compact on disk; /get_results renders them via jsonify)
+    write_json_atomic(RESULTS_FILE, results)
     
     print(f"\n✅ Results saved to {RESULTS_FILE}")
     print(f"📊 Final Tally ({results['tally_type']}):")
@@ -292,6 +681,15 @@ def tally_votes(new_decrypted_votes, incremental=False):
 
 
 # ============ Flask Routes ============
+
+def get_request_payload():
+    """Parse the request body as msgpack or JSON, depending on its Content-Type"""
+    if request.mimetype == "application/msgpack":
+        if msgpack is None:
+            raise ValueError("msgpack body received but msgpack is not installed")
+        return msgpack.unpackb(request.get_data(), raw=False)
+    return request.get_json()
+
 @app.route('/', methods=['GET'])
 def index():
     """Root endpoint with service information"""
@@ -307,7 +705,8 @@ def index():
             "/store_vote": "POST - Store encrypted vote (works even during tallying)",
             "/tally_results": "POST - Decrypt and tally votes (incremental or full)",
             "/get_results": "GET - View tallied results",
-            "/tally_status": "GET - Check if tallying is in progress"
+            "/tally_status": "GET - Check if tallying is in progress",
+            "/tally_status_stream": "GET - Server-Sent Events stream of tally status"
         }
     })
 
@@ -318,16 +717,37 @@ def store_vote():
     MODIFIED: Always accepts votes, even during tallying
     """
     try:
-        data = request.get_json()
+        data = get_request_payload()
+    except Exception as e:
+        print(f"❌ Storage error: {str(e)}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+    
+    result, status_code = handle_store_vote(data)
+    return jsonify(result), status_code
+
+
+def handle_store_vote(data):
+    """
+    Validate and store a vote record; returns (response dict, HTTP status)
+    Shared by /store_vote and in-process callers (see combined.py).
+    """
+    try:
+        # One lookup per field; each must be a non-empty string
+        if not isinstance(data, dict):
+            data = {}
         voter_id = data.get('voter_id')
         encrypted_vote = data.get('encrypted_vote')
         timestamp = data.get('timestamp')
         
-        if not all([voter_id, encrypted_vote, timestamp]):
-            return jsonify({
+        if not (voter_id and encrypted_vote and timestamp
+                and type(voter_id) is str and type(encrypted_vote) is str and type(timestamp) is str):
+            return {
                 "success": False,
                 "error": "Missing required fields"
-            }), 400
+            }, 400
         
         # Store in ledger (works even if tallying is in progress)
         success, result = store_encrypted_vote(voter_id, encrypted_vote, timestamp)
@@ -340,24 +760,51 @@ def store_vote():
             print(f"✅ Stored vote from voter {voter_id}" + 
                   (" [Tallying in progress - will count in next tally]" if tallying_in_progress else ""))
             
-            return jsonify({
+            return {
                 "success": True,
                 "message": message,
                 "vote_hash": result,
                 "tallying_in_progress": tallying_in_progress
-            })
+            }, 200
         else:
-            return jsonify({
+            return {
                 "success": False,
                 "error": result
-            }), 400
+            }, 400
     
     except Exception as e:
         print(f"❌ Storage error: {str(e)}")
-        return jsonify({
+        return {
             "success": False,
             "error": str(e)
-        }), 500
+        }, 500
+
+
+# Finished async tally jobs kept for polling (oldest dropped first), and for
+# at most TALLY_JOB_TTL_SECONDS. Records are replaced whole, under the lock.
+TALLY_JOB_HISTORY = 20
+TALLY_JOB_TTL_SECONDS = 3600
+_TALLY_JOBS = {}
+_TALLY_JOBS_LOCK = threading.Lock()
+
+
+def set_tally_job(job_id, job):
+    """Store a job record, pruning finished jobs that are too old or too many"""
+    now = time.monotonic()
+    with _TALLY_JOBS_LOCK:
+        _TALLY_JOBS[job_id] = job
+        finished = [k for k, j in _TALLY_JOBS.items() if j["status"] == "done"]
+        excess = len(finished) - TALLY_JOB_HISTORY
+        for k in finished:
+            if excess > 0 or now - _TALLY_JOBS[k]["finished_at"] > TALLY_JOB_TTL_SECONDS:
+                del _TALLY_JOBS[k]
+                excess -= 1
+
+
+def get_tally_job(job_id):
+    """Current record of a job; records are never changed in place"""
+    with _TALLY_JOBS_LOCK:
+        return _TALLY_JOBS.get(job_id)
 
 
 @app.route('/tally_results', methods=['POST'])
@@ -365,6 +812,8 @@ def tally_results():
     """
     Endpoint to decrypt votes and tally results
     MODIFIED: Supports both incremental and full tallying
+    With {"async": true} it returns 202 and a job_id right away; poll
+    GET /tally_results/<job_id> for the outcome.
     """
     global tallying_in_progress
     
@@ -377,28 +826,75 @@ def tally_results():
         
         tallying_in_progress = True
     
+    data = request.get_json(silent=True) or {}
+    if not data.get('async'):
+        response, status_code = run_tally(data)
+        return jsonify(response), status_code
+    
+    job_id = uuid.uuid4().hex
+    set_tally_job(job_id, {"status": "running", "started_at": datetime.now().isoformat()})
+    
+    try:
+        threading.Thread(target=run_tally_job, args=(job_id, data), daemon=True).start()
+    except Exception as e:
+        tallying_in_progress = False
+        with _TALLY_JOBS_LOCK:
+            _TALLY_JOBS.pop(job_id, None)
+        return jsonify({"success": False, "error": str(e)}), 500
+    
+    return jsonify({"success": True, "job_id": job_id, "status": "running"}), 202
+
+
+@app.route('/tally_results/<job_id>', methods=['GET'])
+def tally_job_status(job_id):
+    """Outcome of an async tally job (status 'running' until it finishes)"""
+    job = get_tally_job(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Unknown tally job"}), 404
+    
+    if job["status"] == "running":
+        return jsonify({"success": True, "job_id": job_id, "status": "running"})
+    
+    return jsonify({"job_id": job_id, "status": "done", **job["response"]}), job["status_code"]
+
+
+def run_tally_job(job_id, data):
+    """Thread body for an async tally"""
+    response, status_code = run_tally(data)
+    set_tally_job(job_id, {
+        "status": "done",
+        "response": response,
+        "status_code": status_code,
+        "finished_at": time.monotonic()
+    })
+
+
+def run_tally(data):
+    """
+    Decrypt and tally; returns (response dict, HTTP status)
+    Called with tallying_in_progress already set, and clears it when done.
+    """
+    global tallying_in_progress
+    
     try:
-        data = request.get_json() or {}
         time_lock_seconds = data.get('time_lock_seconds', 10)
         tally_mode = data.get('mode', 'incremental')  # 'incremental' or 'full'
         
         # Check if there are any votes to tally
-        ledger = load_ledger()
-        total_votes_in_ledger = len(ledger.get("votes", []))
-        last_tallied = ledger['metadata'].get('last_tallied_index', -1)
+        total_votes_in_ledger, last_tallied = ledger_counts()
         new_votes_count = total_votes_in_ledger - (last_tallied + 1)
         
         if total_votes_in_ledger == 0:
-            return jsonify({
+            return {
                 "success": False,
                 "error": "No votes in ledger to tally"
-            }), 400
+            }, 400
         
         if tally_mode == 'incremental' and new_votes_count == 0:
-            return jsonify({
+            return {
                 "success": False,
                 "error": "No new votes to tally. All votes have been counted."
-            }), 400
+            }, 400
         
         print(f"\n{'='*60}")
         print(f"📊 Starting Tallying Process ({tally_mode.upper()} mode)")
@@ -411,12 +907,12 @@ def tally_results():
         decrypted_votes = decrypt_all_votes(time_lock_seconds, tally_all=tally_all)
         
         if not decrypted_votes:
-            return jsonify({
+            return {
                 "success": False,
                 "error": f"Failed to decrypt any votes. Check private key and vote format.",
                 "total_votes_in_ledger": total_votes_in_ledger,
                 "successfully_decrypted": 0
-            }), 500
+            }, 500
         
         # Tally results
         incremental = (tally_mode == 'incremental')
@@ -426,41 +922,72 @@ def tally_results():
         print("✅ Election results tallied successfully")
         print(f"{'='*60}\n")
         
-        return jsonify({
+        return {
             "success": True,
             "results": results,
             "votes_processed": len(decrypted_votes),
             "total_votes_in_ledger": total_votes_in_ledger,
             "tally_mode": tally_mode
-        })
+        }, 200
     
     except Exception as e:
         print(f"❌ Tallying error: {str(e)}")
         import traceback
         traceback.print_exc()
-        return jsonify({
+        return {
             "success": False,
             "error": str(e)
-        }), 500
+        }, 500
     
     finally:
         tallying_in_progress = False
 
 
-@app.route('/tally_status', methods=['GET'])
-def tally_status():
-    """Check if tallying is currently in progress"""
-    ledger = load_ledger()
-    total_votes = len(ledger.get("votes", []))
-    last_tallied = ledger['metadata'].get('last_tallied_index', -1)
+def get_tally_status():
+    """Current tallying state and vote counts"""
+    total_votes, last_tallied = ledger_counts()
     new_votes = total_votes - (last_tallied + 1)
     
-    return jsonify({
+    return {
         "tallying_in_progress": tallying_in_progress,
         "total_votes": total_votes,
         "tallied_votes": last_tallied + 1,
         "new_votes_pending": new_votes
-    })
+    }
+
+
+@app.route('/tally_status', methods=['GET'])
+def tally_status():
+    """Check if tallying is currently in progress"""
+    return jsonify(get_tally_status())
+
+
+@app.route('/tally_status_stream', methods=['GET'])
+def tally_status_stream():
+    """
+    Server-Sent Events stream of the tally status
+    An event is only sent when the status changes; a comment line keeps
+    the connection alive while nothing happens. The stream closes after
+    STATUS_STREAM_MAX_SECONDS and the client reconnects.
+    """
+    def generate():
+        last_status = None
+        idle_seconds = 0
+        close_at = time.monotonic() + STATUS_STREAM_MAX_SECONDS
+        yield "retry: 5000\n\n"
+        while time.monotonic() < close_at:
+            status = get_tally_status()
+            if status != last_status:
+                yield f"data: {fast_json.dumps(status).decode()}\n\n"
+                last_status = status
+                idle_seconds = 0
+            elif idle_seconds >= STATUS_STREAM_KEEPALIVE:
+                yield ": keep-alive\n\n"
+                idle_seconds = 0
+            time.sleep(STATUS_STREAM_INTERVAL)
+            idle_seconds += STATUS_STREAM_INTERVAL
+    
+    return Response(generate(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
 
 
 @app.route('/get_results', methods=['GET'])
@@ -468,13 +995,11 @@ def get_results():
     """Get previously tallied results"""
     try:
         if os.path.exists(RESULTS_FILE):
-            with open(RESULTS_FILE, "r") as f:
-                results = json.load(f)
+            with open(RESULTS_FILE, "rb") as f:
+                results = fast_json.load(f)
             
             # Add pending votes info
-            ledger = load_ledger()
-            total_votes = len(ledger.get("votes", []))
-            last_tallied = ledger['metadata'].get('last_tallied_index', -1)
+            total_votes, last_tallied = ledger_counts()
             pending_votes = total_votes - (last_tallied + 1)
             
             return jsonify({
@@ -497,9 +1022,12 @@ def get_results():
 
 @app.route('/ledger', methods=['GET'])
 def view_ledger():
-    """View the encrypted vote ledger"""
-    ledger = load_ledger()
-    return jsonify(ledger)
+    """View the encrypted vote ledger (streamed from the JSONL file)"""
+    # Snapshot how much of the file is complete so the stream is consistent
+    with ledger_write_lock():
+        ledger_size = _LEDGER_OFFSET
+        metadata = dict(_LEDGER_META)
+    return Response(iter_ledger_json(ledger_size, metadata), mimetype="application/json")
 
 
 @app.route('/health', methods=['GET'])
@@ -513,8 +1041,11 @@ def health():
     })
 
 
-# Initialize ledger on startup
-init_ledger()
+# Initialize ledger on startup. Only in the main process: decrypt pool workers
+# started with spawn (macOS/Windows) re-import this module, and must not
+# re-scan the ledger or rewrite its metadata.
+if multiprocessing.parent_process() is None:
+    init_ledger()
 
 if __name__ == "__main__":
     print("="*60)
@@ -522,4 +1053,4 @@ if __name__ == "__main__":
     print("Version 2.0 - Continuous Voting Support")
     print("Running on http://127.0.0.1:5002")
     print("="*60)
-    app.run(debug=True, port=5002, threaded=True)
\ No newline at end of file
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1', port=5002, use_reloader=False, threaded=True)
\ No newline at end of file